@@ -2,10 +2,12 @@ import os
 from flask import Flask, request, jsonify, render_template_string, redirect, url_for, session
 from authlib.integrations.flask_client import OAuth
 from dotenv import load_dotenv
-import gspread
-from google.oauth2.service_account import Credentials
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
+from token_verifier import TokenVerifier
+from write_behind import WriteBehindQueue
+from sheets_client import SheetsClient
+from sheet_mirror import SheetMirror
+from bulk_import import iter_rows, validate, WritePacer
+from rollups import Rollups, PERIODS
 from datetime import datetime
 from enum import Enum
 
@@ -28,17 +30,30 @@ google = oauth.register(
     server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
     client_kwargs={'scope': 'openid email profile'}
 )
+verifier = TokenVerifier(os.getenv("GOOGLE_CLIENT_ID"))
 
-# sheets setup
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
-creds = Credentials.from_service_account_file(
-    "gen-lang-client-0426038503-6e431dbd08af.json", 
-    scopes=SCOPES
+# sheets setup: nothing touches the network until the first flush
+sheets = SheetsClient(
+    "gen-lang-client-0426038503-6e431dbd08af.json",
+    "1KneeEbJFC4ypigGfV--_vHGyTnNiJgwz0uUWJgyrmCY"
 )
-client = gspread.authorize(creds)
-spreadsheet = client.open_by_key("1KneeEbJFC4ypigGfV--_vHGyTnNiJgwz0uUWJgyrmCY")
-sheet1 = spreadsheet.worksheet("Sheet1")
-sheet2 = spreadsheet.worksheet("Sheet2")
+
+# records are acknowledged once journaled locally; a background thread appends them
+records_queue = WriteBehindQueue(sheets.append_rows)
+
+# reads are served from a local mirror kept in sync by our own appends plus delta pulls
+mirror = SheetMirror(sheets)
+
+MAX_QUERY_ROWS = 1000
+
+# hours per user per day/week/month, caught up from the mirror's Sheet2 rows on read
+rollups = Rollups()
+
+# bulk imports write straight to the sheets in chunks, paced under the write quota
+IMPORT_CHUNK_ROWS = int(os.getenv("SHEETS_IMPORT_CHUNK_ROWS", "500"))
+IMPORT_WRITES_PER_MINUTE = int(os.getenv("SHEETS_IMPORT_WRITES_PER_MINUTE", "50"))
+MAX_REPORTED_ERRORS = 1000
+import_pacer = WritePacer(IMPORT_WRITES_PER_MINUTE)
 
 LOGIN_PAGE = """
 <!DOCTYPE html>
@@ -135,6 +150,13 @@ HTML_PAGE = """
 </html>
 """
 
+@app.before_request
+def start_workers():
+    # background threads start in the worker that serves requests, never at
+    # import, so a preloading master neither runs them nor hands them to forks
+    records_queue.start()
+    mirror.start()
+
 @app.route('/')
 def home():
     user = session.get('user')
@@ -159,28 +181,102 @@ def logout():
     session.clear()
     return redirect(url_for('home'))
 
-@app.route('/api/record', methods=['POST'])
-def add_record():
-    user_email = None
-    user_name = "Unknown User"
+@app.route('/auth/stats')
+def auth_stats():
+    return jsonify(verifier.snapshot())
+
+@app.route('/api/queue')
+def queue_status():
+    return jsonify(records_queue.snapshot())
 
+def current_user():
+    # raises ValueError for a bad bearer token
     auth_header = request.headers.get('Authorization')
     if auth_header and auth_header.startswith('Bearer '):
         token = auth_header.split(' ')[1]
-        try:
-            idinfo = id_token.verify_oauth2_token(
-                token, 
-                google_requests.Request(), 
-                os.getenv("GOOGLE_CLIENT_ID")
-            )
-            user_email = idinfo.get('email')
-            user_name = idinfo.get('name', 'Android User')
-        except ValueError as e:
-            return jsonify({'error': f'Invalid token: {str(e)}'}), 401
-    
-    elif 'user' in session:
-        user_email = session['user']['email']
-        user_name = session['user']['name']
+        idinfo = verifier.verify(token)
+        return idinfo.get('email'), idinfo.get('name', 'Android User')
+
+    if 'user' in session:
+        return session['user']['email'], session['user']['name']
+
+    return None, "Unknown User"
+
+def build_rows(user_email, user_name, date, time, first_name, last_name, time_in, time_out, notes, resource):
+    return {
+        "Sheet1": [
+            date, time, first_name, last_name, time_in, time_out, notes
+        ],
+        "Sheet2": [
+            f"{date}@{time}", user_email, user_name, first_name, last_name, date, time, time_in, time_out, "Edit", notes, resource
+        ]
+    }
+
+def save_record(rows):
+    records_queue.enqueue(rows)
+    for sheet, row in rows.items():
+        mirror.record(sheet, row)
+
+@app.route('/api/mirror')
+def mirror_status():
+    return jsonify(mirror.snapshot())
+
+@app.route('/api/records', methods=['GET'])
+def list_records():
+    try:
+        user_email, _ = current_user()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid token: {str(e)}'}), 401
+
+    if not user_email:
+        return jsonify({'error': 'Unauthorized. Please log in.'}), 401
+
+    # only Sheet2 rows carry the submitter's email; Sheet1 has no owner column
+    # and would expose everyone's entries, so it is never listed
+    if request.args.get('sheet', 'Sheet2') != 'Sheet2':
+        return jsonify({'error': 'Only your own Sheet2 records can be listed'}), 400
+    limit = min(request.args.get('limit', 200, type=int), MAX_QUERY_ROWS)
+
+    records = mirror.query(
+        'Sheet2',
+        email=user_email,
+        date_from=request.args.get('from'),
+        date_to=request.args.get('to'),
+        limit=limit
+    )
+    return jsonify({"status": "success", "count": len(records), "records": records})
+
+@app.route('/api/rollups', methods=['GET'])
+def get_rollups():
+    try:
+        user_email, _ = current_user()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid token: {str(e)}'}), 401
+
+    if not user_email:
+        return jsonify({'error': 'Unauthorized. Please log in.'}), 401
+
+    period = request.args.get('period', 'week')
+    if period not in PERIODS:
+        return jsonify({'error': f'period must be one of {", ".join(PERIODS)}'}), 400
+
+    # ?key=2026-W42 is a single primary-key lookup; from/to give a range of periods
+    key = request.args.get('key')
+    rollups.catch_up(mirror)
+    totals = rollups.query(
+        user_email,
+        period,
+        key_from=key or request.args.get('from'),
+        key_to=key or request.args.get('to')
+    )
+    return jsonify({"status": "success", "email": user_email, "period": period, "totals": totals})
+
+@app.route('/api/record', methods=['POST'])
+def add_record():
+    try:
+        user_email, user_name = current_user()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid token: {str(e)}'}), 401
 
     if not user_email:
         return jsonify({'error': 'Unauthorized. Please log in.'}), 401
@@ -198,17 +294,76 @@ def add_record():
         notes = data.get('notes', '')
         resource = data.get('resource', '')
 
-        sheet1.append_row([
-            date_today, current_time, first_name, last_name, time_in, time_out, notes
-        ])
-
-        sheet2.append_row([
-            f"{date_today}@{current_time}", user_email, user_name, first_name, last_name, date_today, current_time, time_in, time_out, "Edit", notes, resource
-        ])
+        save_record(build_rows(
+            user_email, user_name, date_today, current_time, first_name, last_name, time_in, time_out, notes, resource
+        ))
 
-        return jsonify({"status": "success", "message": "Row successfully added to both sheets!"}), 201
+        return jsonify({"status": "success", "message": "Row saved and queued for both sheets!"}), 202
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+def write_import_chunk(chunk, report):
+    for sheet in ("Sheet1", "Sheet2"):
+        values = [rows[sheet] for rows in chunk]
+        import_pacer.wait()
+        try:
+            sheets.append_rows(sheet, values)
+            report["written"][sheet] += len(values)
+        except Exception as e:
+            # nothing is lost: the journal keeps retrying this chunk in the background
+            app.logger.warning("Import chunk to %s failed, handing it to the journal: %s", sheet, e)
+            records_queue.enqueue_rows(sheet, values)
+            report["queued"][sheet] += len(values)
+        for rows in chunk:
+            mirror.record(sheet, rows[sheet])
+
+@app.route('/api/records/import', methods=['POST'])
+def import_records():
+    try:
+        user_email, user_name = current_user()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid token: {str(e)}'}), 401
+
+    if not user_email:
+        return jsonify({'error': 'Unauthorized. Please log in.'}), 401
+
+    fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+
+    report = {
+        "rows": 0,
+        "imported": 0,
+        "written": {"Sheet1": 0, "Sheet2": 0},
+        "queued": {"Sheet1": 0, "Sheet2": 0},
+        "error_count": 0,
+        "errors": []
+    }
+    chunk = []
+    for line_number, row, error in iter_rows(request.stream, fmt):
+        report["rows"] += 1
+        if error is None:
+            record, error = validate(row)
+        if error:
+            report["error_count"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                report["errors"].append({"line": line_number, "error": error})
+            continue
+
+        chunk.append(build_rows(user_email, user_name, **record))
+        if len(chunk) >= IMPORT_CHUNK_ROWS:
+            write_import_chunk(chunk, report)
+            report["imported"] += len(chunk)
+            chunk = []
+            app.logger.info("Import for %s: %d rows read, %d imported, %d errors",
+                            user_email, report["rows"], report["imported"], report["error_count"])
+
+    if chunk:
+        write_import_chunk(chunk, report)
+        report["imported"] += len(chunk)
+
+    report["status"] = "success" if not report["error_count"] else "partial"
+    return jsonify(report), 200
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
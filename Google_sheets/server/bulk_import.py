@@ -0,0 +1,65 @@
+# incremental CSV / NDJSON parsing and validation for bulk time-record imports
+import io
+import re
+import csv
+import json
+import time
+import threading
+from datetime import datetime
+
+FIELDS = ["date", "time", "first_name", "last_name", "time_in", "time_out", "notes", "resource"]
+CLOCK = re.compile(r"^\d{1,2}:\d{2}(:\d{2})?$")
+
+
+def iter_rows(stream, fmt: str):
+    # yields (line_number, dict | None, error | None) without reading the whole body
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, None, f"Invalid JSON: {e.msg}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, "Expected a JSON object"
+            continue
+        yield line_number, row, None
+
+
+def validate(row: dict) -> tuple[dict | None, str | None]:
+    record = {field: str(row.get(field) or "").strip() for field in FIELDS}
+    try:
+        datetime.strptime(record["date"], "%Y-%m-%d")
+    except ValueError:
+        return None, f"Invalid date '{record['date']}', expected YYYY-MM-DD"
+    if not record["time"]:
+        record["time"] = "00:00:00"
+    for field in ("time", "time_in", "time_out"):
+        if record[field] and not CLOCK.match(record[field]):
+            return None, f"Invalid {field} '{record[field]}', expected HH:MM"
+    if not record["first_name"] and not record["last_name"]:
+        return None, "first_name or last_name is required"
+    return record, None
+
+
+class WritePacer:
+    # spaces out write calls to stay under the Sheets per-minute write quota
+    def __init__(self, writes_per_minute: int):
+        self.interval = 60.0 / max(writes_per_minute, 1)
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,127 @@
+# per-user hours rollups by day / ISO week / month, derived incrementally from the sheet mirror
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+ROLLUPS_DB = os.getenv("SHEETS_ROLLUPS_DB", "sheets_rollups.sqlite3")
+PERIODS = ("day", "week", "month")
+CATCH_UP_BATCH = 5000
+
+
+def _clock(value):
+    for fmt in ("%H:%M", "%H:%M:%S"):
+        try:
+            parsed = datetime.strptime(value.strip(), fmt)
+            return parsed.hour * 60 + parsed.minute
+        except ValueError:
+            continue
+    return None
+
+
+def worked_minutes(time_in: str, time_out: str) -> int | None:
+    start, end = _clock(time_in or ""), _clock(time_out or "")
+    if start is None or end is None:
+        return None
+    # a shift that ends before it starts ran past midnight
+    return (end - start) % (24 * 60)
+
+
+def period_keys(date: str) -> dict:
+    day = datetime.strptime(date, "%Y-%m-%d")
+    year, week, _ = day.isocalendar()
+    return {"day": date, "week": f"{year}-W{week:02d}", "month": day.strftime("%Y-%m")}
+
+
+class Rollups:
+    def __init__(self, db_path: str = ROLLUPS_DB):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._db_pid = None
+        self._db().execute(
+            "CREATE TABLE IF NOT EXISTS rollups ("
+            " email TEXT NOT NULL, period TEXT NOT NULL, period_key TEXT NOT NULL,"
+            " minutes INTEGER NOT NULL, entries INTEGER NOT NULL,"
+            " PRIMARY KEY (email, period, period_key))"
+        )
+        self._db().execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _db(self):
+        if self._db_pid != os.getpid():
+            # forked: connections opened by the parent must not be used here
+            self._local = threading.local()
+            self._db_pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _seen(self):
+        row = self._db().execute("SELECT value FROM meta WHERE key = 'seen_id'").fetchone()
+        return row[0] if row else None
+
+    def catch_up(self, mirror) -> int:
+        # totals follow the mirror's Sheet2 rows, so rows already in the sheet and
+        # rows added elsewhere count too: the first call counts every mirrored
+        # row, later calls only rows mirrored since
+        if self._seen() == mirror.last_id("Sheet2"):
+            return 0
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            seen = self._seen()
+            if seen is None:
+                # totals kept before the first catch-up only covered local appends
+                db.execute("DELETE FROM rollups")
+                seen = 0
+            counted = 0
+            while True:
+                rows = mirror.rows_after("Sheet2", seen, CATCH_UP_BATCH)
+                if not rows:
+                    break
+                updates = []
+                for _, row in rows:
+                    updates.extend(self._updates(row["email"], row["date"], row["time_in"], row["time_out"]))
+                db.executemany(
+                    "INSERT INTO rollups VALUES (?, ?, ?, ?, 1)"
+                    " ON CONFLICT (email, period, period_key) DO UPDATE SET"
+                    " minutes = minutes + excluded.minutes, entries = entries + 1",
+                    updates
+                )
+                counted += len(updates) // len(PERIODS)
+                seen = rows[-1][0]
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('seen_id', ?)", (seen,))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return counted
+
+    def _updates(self, email, date, time_in, time_out) -> list:
+        # rows without an owner, a usable date or clock times don't count towards any total
+        minutes = worked_minutes(time_in, time_out)
+        if not email or minutes is None:
+            return []
+        try:
+            keys = period_keys(date)
+        except ValueError:
+            return []
+        return [(email, period, keys[period], minutes) for period in PERIODS]
+
+    def query(self, email: str, period: str, key_from: str | None = None,
+              key_to: str | None = None) -> list[dict]:
+        sql = "SELECT period_key, minutes, entries FROM rollups WHERE email = ? AND period = ?"
+        params = [email, period]
+        if key_from:
+            sql += " AND period_key >= ?"
+            params.append(key_from)
+        if key_to:
+            sql += " AND period_key <= ?"
+            params.append(key_to)
+        sql += " ORDER BY period_key DESC"
+        return [
+            {"period": key, "hours": round(minutes / 60, 2), "minutes": minutes, "entries": entries}
+            for key, minutes, entries in self._db().execute(sql, params)
+        ]
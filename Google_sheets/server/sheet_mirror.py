@@ -0,0 +1,221 @@
+# local SQLite mirror of Sheet1/Sheet2 so reads never go to the Sheets API
+import os
+import re
+import json
+import time
+import logging
+import sqlite3
+import threading
+
+log = logging.getLogger(__name__)
+
+MIRROR_DB = os.getenv("SHEETS_MIRROR_DB", "sheets_mirror.sqlite3")
+PULL_INTERVAL = float(os.getenv("SHEETS_MIRROR_PULL_INTERVAL", "300"))
+PULL_LEASE = 120
+
+COLUMNS = {
+    "Sheet1": ["date", "time", "first_name", "last_name", "time_in", "time_out", "notes"],
+    "Sheet2": ["id", "email", "name", "first_name", "last_name", "date", "time",
+               "time_in", "time_out", "action", "notes", "resource"],
+}
+LAST_COLUMN = {"Sheet1": "G", "Sheet2": "L"}
+ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def _content(row):
+    # Sheets hands values back as strings and drops trailing blanks
+    values = ["" if v is None else str(v) for v in row]
+    while values and values[-1] == "":
+        values.pop()
+    return json.dumps(values, ensure_ascii=False)
+
+
+class SheetMirror:
+    def __init__(self, sheets, db_path: str = MIRROR_DB, pull_interval: float = PULL_INTERVAL):
+        self.sheets = sheets
+        self.db_path = db_path
+        self.pull_interval = pull_interval
+        self._local = threading.local()
+        self._db_pid = None
+        self._lock = threading.Lock()
+        self._pid = None
+        self.stats = {"pulls": 0, "pulled_rows": 0, "matched_local": 0,
+                      "last_pull_ms": None, "last_error": None}
+        db = self._db()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, sheet TEXT NOT NULL, row_num INTEGER,"
+            " email TEXT, date TEXT, content TEXT NOT NULL, UNIQUE (sheet, row_num))"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS records_email_date ON records (sheet, email, date)")
+        db.execute("CREATE INDEX IF NOT EXISTS records_date ON records (sheet, date)")
+        db.execute("CREATE INDEX IF NOT EXISTS records_pending ON records (sheet, content) WHERE row_num IS NULL")
+        db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL NOT NULL)")
+
+    def _db(self):
+        if self._db_pid != os.getpid():
+            # forked: connections opened by the parent must not be used here
+            self._local = threading.local()
+            self._db_pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _fields(self, sheet, row):
+        cols = COLUMNS[sheet]
+        padded = list(row) + [""] * (len(cols) - len(row))
+        email = padded[cols.index("email")] if "email" in cols else None
+        return (email or None), padded[cols.index("date")]
+
+    def record(self, sheet: str, row: list):
+        # rows the app appends itself show up immediately; the pull later pins their row number
+        email, date = self._fields(sheet, row)
+        self._db().execute(
+            "INSERT INTO records (sheet, email, date, content) VALUES (?, ?, ?, ?)",
+            (sheet, email, date, _content(row))
+        )
+
+    def _meta(self, key, default=0.0):
+        row = self._db().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self._db().execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    def _take_pull_lease(self):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if self._meta("pull_lease") > time.time():
+                db.execute("ROLLBACK")
+                return False
+            self._set_meta("pull_lease", time.time() + PULL_LEASE)
+            db.execute("COMMIT")
+            return True
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def pull(self, sheet: str) -> int:
+        # delta pull: only rows below the last one we have already seen
+        synced = int(self._meta(f"synced:{sheet}"))
+        start = synced + 1
+        values = self.sheets.call(sheet, "get_values", f"A{start}:{LAST_COLUMN[sheet]}")
+        db = self._db()
+        matched = 0
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for offset, row in enumerate(values):
+                row_num = start + offset
+                email, date = self._fields(sheet, row)
+                if not ISO_DATE.match(date or ""):
+                    continue  # header or blank row
+                content = _content(row)
+                cur = db.execute(
+                    "UPDATE records SET row_num = ? WHERE id = ("
+                    " SELECT id FROM records WHERE sheet = ? AND row_num IS NULL AND content = ?"
+                    " ORDER BY id LIMIT 1)",
+                    (row_num, sheet, content)
+                )
+                if cur.rowcount:
+                    matched += 1
+                else:
+                    db.execute(
+                        "INSERT OR IGNORE INTO records (sheet, row_num, email, date, content)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        (sheet, row_num, email, date, content)
+                    )
+            self._set_meta(f"synced:{sheet}", synced + len(values))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        with self._lock:
+            self.stats["matched_local"] += matched
+        return len(values)
+
+    def sync(self) -> bool:
+        # only one worker pulls at a time; the others read what it wrote
+        if not self._take_pull_lease():
+            return False
+        started = time.perf_counter()
+        try:
+            pulled = sum(self.pull(sheet) for sheet in COLUMNS)
+            with self._lock:
+                self.stats["pulls"] += 1
+                self.stats["pulled_rows"] += pulled
+                self.stats["last_pull_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                self.stats["last_error"] = None
+            self._set_meta("last_pull", time.time())
+            return True
+        finally:
+            self._set_meta("pull_lease", 0)
+
+    def start(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                threading.Thread(target=self._run, name="sheets-mirror", daemon=True).start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            try:
+                self.sync()
+            except Exception as e:
+                log.warning("Mirror pull failed: %s", e)
+                with self._lock:
+                    self.stats["last_error"] = str(e)
+            time.sleep(self.pull_interval)
+
+    def query(self, sheet: str, email: str | None = None, date_from: str | None = None,
+              date_to: str | None = None, limit: int = 500) -> list[dict]:
+        sql = "SELECT content FROM records WHERE sheet = ?"
+        params = [sheet]
+        if email is not None:
+            sql += " AND email = ?"
+            params.append(email)
+        if date_from:
+            sql += " AND date >= ?"
+            params.append(date_from)
+        if date_to:
+            sql += " AND date <= ?"
+            params.append(date_to)
+        sql += " ORDER BY date DESC, id DESC LIMIT ?"
+        params.append(limit)
+        cols = COLUMNS[sheet]
+        rows = []
+        for (content,) in self._db().execute(sql, params):
+            values = json.loads(content)
+            rows.append(dict(zip(cols, values + [""] * (len(cols) - len(values)))))
+        return rows
+
+    def rows_after(self, sheet: str, after_id: int, limit: int = 5000) -> list[tuple[int, dict]]:
+        # (mirror id, row) in insertion order, for readers that follow the mirror
+        # incrementally; ids only grow, and a pull pinning a row number keeps its id
+        cols = COLUMNS[sheet]
+        rows = []
+        for row_id, content in self._db().execute(
+                "SELECT id, content FROM records WHERE sheet = ? AND id > ? ORDER BY id LIMIT ?",
+                (sheet, after_id, limit)):
+            values = json.loads(content)
+            rows.append((row_id, dict(zip(cols, values + [""] * (len(cols) - len(values))))))
+        return rows
+
+    def last_id(self, sheet: str) -> int:
+        return self._db().execute("SELECT COALESCE(MAX(id), 0) FROM records WHERE sheet = ?",
+                                  (sheet,)).fetchone()[0]
+
+    def snapshot(self) -> dict:
+        db = self._db()
+        with self._lock:
+            stats = dict(self.stats)
+        stats["rows"] = dict(db.execute("SELECT sheet, COUNT(*) FROM records GROUP BY sheet").fetchall())
+        stats["unconfirmed"] = db.execute("SELECT COUNT(*) FROM records WHERE row_num IS NULL").fetchone()[0]
+        last_pull = self._meta("last_pull")
+        stats["last_pull_age_s"] = round(time.time() - last_pull, 1) if last_pull else None
+        return stats
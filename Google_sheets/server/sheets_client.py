@@ -0,0 +1,92 @@
+# lazily opened, fork-safe gspread client with cached worksheet handles
+import os
+import logging
+import datetime
+import threading
+import gspread
+import requests
+from google.auth import exceptions as auth_exceptions
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+
+log = logging.getLogger(__name__)
+
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+# refresh the access token this long before Google would reject it
+REFRESH_MARGIN = datetime.timedelta(minutes=5)
+RECONNECT_ERRORS = (requests.ConnectionError, requests.Timeout, auth_exceptions.TransportError)
+
+
+def _status(error):
+    code = getattr(error, "code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    return code
+
+
+class SheetsClient:
+    def __init__(self, key_file: str, spreadsheet_key: str, scopes: list = SCOPES):
+        self.key_file = key_file
+        self.spreadsheet_key = spreadsheet_key
+        self.scopes = scopes
+        self._lock = threading.Lock()
+        self._pid = None
+        self._creds = None
+        self._spreadsheet = None
+        self._worksheets = {}
+        self.reconnects = 0
+
+    def _connect(self):
+        creds = Credentials.from_service_account_file(self.key_file, scopes=self.scopes)
+        client = gspread.authorize(creds)
+        self._spreadsheet = client.open_by_key(self.spreadsheet_key)
+        self._creds = creds
+        self._worksheets = {}
+        self._pid = os.getpid()
+        log.info("Opened spreadsheet %s", self.spreadsheet_key)
+
+    def _ensure(self):
+        # a connection inherited across fork() is never reused by the child
+        with self._lock:
+            if self._spreadsheet is None or self._pid != os.getpid():
+                self._connect()
+            creds = self._creds
+            expiry = creds.expiry.replace(tzinfo=None) if creds.expiry else None
+            if not creds.valid or (expiry and expiry - datetime.datetime.utcnow() < REFRESH_MARGIN):
+                creds.refresh(Request())
+            return self._spreadsheet
+
+    def worksheet(self, name: str):
+        spreadsheet = self._ensure()
+        with self._lock:
+            ws = self._worksheets.get(name)
+        if ws is None:
+            ws = spreadsheet.worksheet(name)
+            with self._lock:
+                self._worksheets[name] = ws
+        return ws
+
+    def reset(self):
+        with self._lock:
+            self._spreadsheet = None
+            self._worksheets = {}
+            self.reconnects += 1
+
+    def call(self, name: str, method: str, *args, **kwargs):
+        # run a worksheet method, reconnecting once if the connection went stale
+        for attempt in range(2):
+            try:
+                return getattr(self.worksheet(name), method)(*args, **kwargs)
+            except gspread.exceptions.APIError as e:
+                status = _status(e)
+                if attempt or not (status == 401 or (status or 0) >= 500):
+                    raise
+                log.warning("Sheets API error %s, reconnecting", status)
+            except RECONNECT_ERRORS as e:
+                if attempt:
+                    raise
+                log.warning("Sheets connection error, reconnecting: %s", e)
+            self.reset()
+
+    def append_rows(self, name: str, values: list):
+        return self.call(name, "append_rows", values)
@@ -0,0 +1,175 @@
+# durable write-behind queue: rows are journaled to SQLite first, then appended to the sheets in batches
+import os
+import json
+import time
+import logging
+import sqlite3
+import threading
+
+log = logging.getLogger(__name__)
+
+JOURNAL_DB = os.getenv("SHEETS_JOURNAL_DB", "sheets_journal.sqlite3")
+FLUSH_BATCH_SIZE = int(os.getenv("SHEETS_FLUSH_BATCH_SIZE", "50"))
+FLUSH_INTERVAL = float(os.getenv("SHEETS_FLUSH_INTERVAL", "2"))
+MAX_BACKOFF = float(os.getenv("SHEETS_MAX_BACKOFF", "60"))
+# rows claimed by a worker that died mid-flush become visible again after this long
+LEASE_SECONDS = 120
+
+
+class WriteBehindQueue:
+    def __init__(self, append_rows, db_path: str = JOURNAL_DB,
+                 batch_size: int = FLUSH_BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL):
+        self.append_rows = append_rows
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._db_pid = None
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+        self.stats = {"enqueued": 0, "flushed": 0, "flushes": 0, "failures": 0,
+                      "last_flush_ms": None, "last_error": None}
+        self._db().execute(
+            "CREATE TABLE IF NOT EXISTS journal ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, target TEXT NOT NULL,"
+            " payload TEXT NOT NULL, created_at REAL NOT NULL, lease_until REAL)"
+        )
+        self._db().execute("CREATE INDEX IF NOT EXISTS journal_target ON journal (target, id)")
+
+    def _db(self):
+        if self._db_pid != os.getpid():
+            # forked: connections opened by the parent must not be used here
+            self._local = threading.local()
+            self._db_pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def start(self):
+        # one flusher per process; started lazily so forked workers get their own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                threading.Thread(target=self._run, name="sheets-flusher", daemon=True).start()
+                self._pid = os.getpid()
+
+    def enqueue(self, rows: dict):
+        # rows maps worksheet name -> row values; all of them commit together
+        self.start()
+        now = time.time()
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany(
+                "INSERT INTO journal (target, payload, created_at) VALUES (?, ?, ?)",
+                [(target, json.dumps(row), now) for target, row in rows.items()]
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        with self._lock:
+            self.stats["enqueued"] += 1
+        if self.depth() >= self.batch_size:
+            self._wakeup.set()
+
+    def enqueue_rows(self, target: str, rows: list):
+        # many rows for one worksheet, e.g. an import chunk whose direct append failed
+        self.start()
+        now = time.time()
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany(
+                "INSERT INTO journal (target, payload, created_at) VALUES (?, ?, ?)",
+                [(target, json.dumps(row), now) for row in rows]
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        self._wakeup.set()
+
+    def _claim(self, target):
+        db = self._db()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = db.execute(
+                "SELECT id, payload FROM journal WHERE target = ?"
+                " AND (lease_until IS NULL OR lease_until < ?) ORDER BY id LIMIT ?",
+                (target, now, self.batch_size)
+            ).fetchall()
+            db.executemany("UPDATE journal SET lease_until = ? WHERE id = ?",
+                           [(now + LEASE_SECONDS, row_id) for row_id, _ in rows])
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return [row_id for row_id, _ in rows], [json.loads(payload) for _, payload in rows]
+
+    def flush(self) -> int:
+        # each worksheet is drained independently, so a failure on one never
+        # re-sends rows that already landed on the other
+        db = self._db()
+        flushed = 0
+        targets = [t for (t,) in db.execute("SELECT DISTINCT target FROM journal")]
+        for target in targets:
+            while True:
+                ids, values = self._claim(target)
+                if not ids:
+                    break
+                started = time.perf_counter()
+                try:
+                    self.append_rows(target, values)
+                except Exception:
+                    db.executemany("UPDATE journal SET lease_until = NULL WHERE id = ?",
+                                   [(i,) for i in ids])
+                    raise
+                db.executemany("DELETE FROM journal WHERE id = ?", [(i,) for i in ids])
+                flushed += len(ids)
+                with self._lock:
+                    self.stats["flushes"] += 1
+                    self.stats["flushed"] += len(ids)
+                    self.stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                if len(ids) < self.batch_size:
+                    break
+        return flushed
+
+    def _run(self):
+        backoff = 0.0
+        while True:
+            if backoff:
+                # new records must not cut a backoff short during an outage
+                time.sleep(backoff)
+            else:
+                self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                backoff = 0.0
+            except Exception as e:
+                backoff = min(MAX_BACKOFF, max(1.0, backoff * 2))
+                log.warning("Sheets flush failed, retrying in %.0fs: %s", backoff, e)
+                with self._lock:
+                    self.stats["failures"] += 1
+                    self.stats["last_error"] = str(e)
+
+    def depth(self) -> int:
+        return self._db().execute("SELECT COUNT(*) FROM journal").fetchone()[0]
+
+    def snapshot(self) -> dict:
+        db = self._db()
+        oldest = db.execute("SELECT MIN(created_at) FROM journal").fetchone()[0]
+        per_target = dict(db.execute("SELECT target, COUNT(*) FROM journal GROUP BY target").fetchall())
+        with self._lock:
+            stats = dict(self.stats)
+        stats["depth"] = sum(per_target.values())
+        stats["depth_by_sheet"] = per_target
+        stats["oldest_age_s"] = round(time.time() - oldest, 1) if oldest else 0.0
+        return stats
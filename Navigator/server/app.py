@@ -1,9 +1,19 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from providers import ProviderError, default_registry, UNKNOWN_PROVIDER
+from provider_router import ProviderRouter
+from language_detector import LanguageDetector, same_language
 
 app = Flask(__name__)
 CORS(app) # allows requests from your Android app/emulator
 
+registry = default_registry()
+router = ProviderRouter(registry)
+detector = LanguageDetector()
+
+MAX_DETECT_BATCH = 1000
+MAX_TARGETS = 20
+
 @app.route("/translate", methods=["POST"])
 def translate():
     data = request.get_json(silent=True) or {}
@@ -22,29 +32,104 @@ def translate():
             "message": "Text is required"
         }), 400
 
-    # Mock behavior depending on provider
-    if provider == "ChatGPT/OpenAI":
-        translated_text = f"[OpenAI Flask Mock] Translation to {target_language}: {text}"
-    elif provider == "Google":
-        translated_text = f"[Google Flask Mock] Translation to {target_language}: {text.upper()}"
-    elif provider == "Open Source":
-        translated_text = f"[Open Source Flask Mock] {text} -> translated to {target_language}"
+    # detection is only reported: short texts are easily misdetected, so only
+    # the caller's own sourceLanguage may skip the provider
+    detected_language = detector.resolve(text, source_language)
+    if "targetLanguages" in data:
+        return translate_targets(text, source_language, detected_language, data["targetLanguages"], provider)
+
+    if same_language(source_language, target_language):
+        # already in the target language, no provider call needed
+        return jsonify({
+            "translatedText": text,
+            "providerUsed": "none",
+            "detectedLanguage": detected_language,
+            "status": "success"
+        })
+
+    # "auto" lets the router pick (and hedge across) the fastest healthy provider
+    if provider == "auto":
+        chosen = None
     else:
-        translated_text = f"[Unknown Provider Mock] Translation to {target_language}: {text}"
-    
+        chosen = registry.get(provider) or UNKNOWN_PROVIDER
+    try:
+        translated_text, provider_used = router.translate(chosen, text, source_language, target_language)
+    except (ProviderError, TimeoutError) as e:
+        return jsonify({
+            "translatedText": "",
+            "providerUsed": provider,
+            "detectedLanguage": detected_language,
+            "status": "error",
+            "message": str(e) or "Provider timed out"
+        }), 502
+    if chosen is not None:
+        provider_used = provider
+
     return jsonify({
         "translatedText": translated_text,
-        "providerUsed": provider,
-        "detectedLanguage": source_language,
+        "providerUsed": provider_used,
+        "detectedLanguage": detected_language,
         "status": "success"
         })
 
+def translate_targets(text, source_language, detected_language, targets, provider):
+    # {"targetLanguages": ["fr", "de", ...]}: all targets concurrently, one response
+    if not (isinstance(targets, list) and 0 < len(targets) <= MAX_TARGETS
+            and all(isinstance(t, str) and t.strip() for t in targets)):
+        return jsonify({
+            "status": "error",
+            "detectedLanguage": detected_language,
+            "message": f"targetLanguages must list 1 to {MAX_TARGETS} language codes"
+        }), 400
+    targets = list(dict.fromkeys(targets))
+    translations, providers_used, errors = {}, {}, {}
+    remote = []
+    for target in targets:
+        if same_language(source_language, target):
+            translations[target], providers_used[target] = text, "none"
+        else:
+            remote.append(target)
+    if remote:
+        chosen = None if provider == "auto" else registry.get(provider) or UNKNOWN_PROVIDER
+        for target, result in zip(remote, router.translate_targets(chosen, text, source_language, remote)):
+            if isinstance(result, Exception):
+                errors[target] = str(result) or "Provider timed out"
+            else:
+                translations[target] = result[0]
+                providers_used[target] = provider if chosen is not None else result[1]
+    body = {
+        "translations": translations,
+        "providersUsed": providers_used,
+        "detectedLanguage": detected_language,
+        "status": "success" if not errors else ("partial" if translations else "error")
+    }
+    if errors:
+        body["errors"] = errors
+    return jsonify(body), 502 if errors and not translations else 200
+
+@app.route("/detect", methods=["POST"])
+def detect():
+    # {"text": "..."} or {"texts": ["...", ...]}; each result is
+    # {"language", "confidence"}, or null for text without letters
+    data = request.get_json(silent=True) or {}
+    texts = data.get("texts")
+    if texts is None:
+        return jsonify({"result": detector.detect(str(data.get("text", "")))})
+    if not isinstance(texts, list) or len(texts) > MAX_DETECT_BATCH:
+        return jsonify({"status": "error", "message": f"texts must be a list of at most {MAX_DETECT_BATCH}"}), 400
+    return jsonify({"results": detector.detect_many([str(t) for t in texts])})
+
+@app.route("/providers/stats", methods=["GET"])
+def provider_stats():
+    return jsonify(router.snapshot())
+
 @app.route("/", methods=["GET"])
 def home():
     return jsonify({
         "message": "Flask translation mock backend is running",
         "endpoint": "/translate",
-        "method": "POST"
+        "method": "POST",
+        "providers": registry.names() + ["auto"]
     })
 
 if __name__ == "__main__":
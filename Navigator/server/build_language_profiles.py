@@ -0,0 +1,99 @@
+# builds language_profiles.npz, the detector profiles shipped with the server.
+# Only needed after changing language_data/ or the sources below; the packages
+# are build-time only and not used by the running server:
+#   pip install babel==2.18.0 faker==40.43.0 spacy==3.8.16
+#   python build_language_profiles.py
+#
+# Per language the corpus joins
+# - language_data/<code>.txt: hand-written sample sentences
+# - Unicode CLDR locale data (via babel): names of languages, countries,
+#   currencies and units, months and days, relative-time phrases
+# - spaCy: stop words and example sentences
+# - Faker: locale word lists (common words, colours, currencies)
+import os
+import re
+import importlib
+from language_detector import BASE_DIR, PROFILES_PATH, build_profiles, save_profiles
+
+CORPUS_DIR = os.path.join(BASE_DIR, "language_data")
+
+# detector code -> (CLDR locale, spaCy language, Faker locales)
+LANGUAGES = {
+    "ar": ("ar", "ar", ["ar_AA"]),
+    "de": ("de", "de", ["de_DE", "de_AT"]),
+    "en": ("en", "en", ["en_US"]),
+    "es": ("es", "es", ["es_ES", "es_MX", "es_AR"]),
+    "fr": ("fr", "fr", ["fr_FR"]),
+    "hi": ("hi", "hi", ["hi_IN"]),
+    "it": ("it", "it", ["it_IT"]),
+    "ja": ("ja", "ja", ["ja_JP"]),
+    "ko": ("ko", "ko", ["ko_KR"]),
+    "nl": ("nl", "nl", ["nl_NL", "nl_BE"]),
+    "pt": ("pt", "pt", ["pt_BR", "pt_PT"]),
+    "ru": ("ru", "ru", ["ru_RU"]),
+    "zh-cn": ("zh", "zh", ["zh_CN"]),
+}
+# job titles and place names are mostly proper nouns and skew the profiles
+FAKER_PROVIDERS = ("lorem", "color", "currency")
+
+# CLDR date/number patterns and Faker format strings are not language
+_CLDR_PATTERN = re.compile(r"^[\W\dGyYMLdEecHhKkmsSaAzZvVOxXQqwWuUrgDFB]+$")
+_FAKER_FORMAT = re.compile(r"[{}#?%`@_/\d]|http")
+
+
+def _strings(value, out: list):
+    if isinstance(value, str):
+        out.append(value)
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            _strings(key, out)
+            _strings(item, out)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            _strings(item, out)
+    elif hasattr(value, "__dict__"):
+        _strings(vars(value), out)
+
+
+def cldr_text(locale: str) -> list:
+    from babel.localedata import load
+    out = []
+    _strings(load(locale, merge_inherited=False), out)
+    return [re.sub(r"\{\d\}", " ", s) for s in dict.fromkeys(out)
+            if len(re.findall(r"[^\W\d_]", s)) >= 3 and not _CLDR_PATTERN.match(s) and "'" not in s]
+
+
+def spacy_text(lang: str) -> list:
+    examples = importlib.import_module(f"spacy.lang.{lang}.examples").sentences
+    stop_words = importlib.import_module(f"spacy.lang.{lang}.stop_words").STOP_WORDS
+    return list(examples) + [" ".join(sorted(stop_words))]
+
+
+def faker_text(locales: list) -> list:
+    out = []
+    for locale in locales:
+        for provider in FAKER_PROVIDERS:
+            try:
+                module = importlib.import_module(f"faker.providers.{provider}.{locale}")
+            except ModuleNotFoundError:
+                continue
+            for name, value in vars(module.Provider).items():
+                if not name.startswith("_"):
+                    _strings(value, out)
+    words = [s for s in out if not _FAKER_FORMAT.search(s) and not s.isupper()]
+    return [" ".join(dict.fromkeys(words))]
+
+
+def corpus(code: str) -> str:
+    cldr, spacy_lang, faker_locales = LANGUAGES[code]
+    with open(os.path.join(CORPUS_DIR, f"{code}.txt"), encoding="utf-8") as fh:
+        parts = [fh.read()]
+    parts += spacy_text(spacy_lang) + faker_text(faker_locales) + cldr_text(cldr)
+    return "\n".join(parts)
+
+
+if __name__ == "__main__":
+    labels = sorted(LANGUAGES)
+    texts = [corpus(code) for code in labels]
+    save_profiles(PROFILES_PATH, labels, build_profiles(texts))
+    print(f"Built profiles for {', '.join(labels)} from {sum(map(len, texts))} characters into {PROFILES_PATH}")
@@ -0,0 +1,152 @@
+# in-process language detection from hashed character n-gram and word profiles
+#   python build_language_profiles.py   rebuilds the shipped language_profiles.npz
+import os
+import re
+import zlib
+import threading
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILES_PATH = os.getenv("NAVIGATOR_LANGUAGE_PROFILES", os.path.join(BASE_DIR, "language_profiles.npz"))
+MIN_CONFIDENCE = float(os.getenv("NAVIGATOR_DETECT_MIN_CONFIDENCE", "0.7"))
+
+HASH_BITS = 16
+NGRAM_SIZES = (1, 2, 3)
+SMOOTHING = 0.01
+# a known whole word says more about a short text than its letter n-grams do
+WORD_WEIGHT = 2
+# confidences come from the average log-likelihood per feature, so a long text
+# is not declared certain just for being long
+TEMPERATURE = 6.0
+_PRIME = np.uint64(1000003)
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_WORD_TAG = np.uint64(1 << 40)
+_NOT_LETTERS = re.compile(r"[\W\d_]+")
+
+
+def ngram_buckets(text: str) -> np.ndarray:
+    # polynomial hash of every 1..3-gram of code points, computed over whole
+    # arrays instead of character by character
+    cleaned = " " + _NOT_LETTERS.sub(" ", text.lower()).strip() + " "
+    if len(cleaned) < 3:
+        return np.empty(0, dtype=np.int64)
+    points = np.frombuffer(cleaned.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    parts = []
+    with np.errstate(over="ignore"):
+        for n in NGRAM_SIZES:
+            if len(points) < n:
+                continue
+            h = np.full(len(points) - n + 1, n, dtype=np.uint64)
+            for k in range(n):
+                h = h * _PRIME + points[k:len(points) - n + 1 + k]
+            parts.append(((h * _MIX) >> np.uint64(64 - HASH_BITS)).astype(np.int64))
+    return np.concatenate(parts)
+
+
+def word_buckets(text: str) -> np.ndarray:
+    # crc32 rather than hash(): the buckets must not change between processes
+    words = _NOT_LETTERS.sub(" ", text.lower()).split()
+    h = np.array([zlib.crc32(w.encode("utf-8")) for w in words], dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        return (((h + _WORD_TAG) * _MIX) >> np.uint64(64 - HASH_BITS)).astype(np.int64)
+
+
+def build_profiles(texts: list) -> dict:
+    # bucket-major (buckets x languages) table of smoothed log-probabilities,
+    # quantized per language to one byte: log p = table * scale + offset
+    size = 1 << HASH_BITS
+    logp = np.empty((size, len(texts)), dtype=np.float64)
+    for col, text in enumerate(texts):
+        features = np.concatenate([ngram_buckets(text), word_buckets(text)])
+        counts = np.bincount(features, minlength=size).astype(np.float64)
+        logp[:, col] = np.log((counts + SMOOTHING) / (counts.sum() + SMOOTHING * size))
+    offset = logp.min(axis=0)
+    scale = (logp.max(axis=0) - offset) / 255
+    table = np.rint((logp - offset) / scale).astype(np.uint8)
+    return {"table": table, "scale": scale.astype(np.float32), "offset": offset.astype(np.float32)}
+
+
+def save_profiles(path: str, labels: list, profiles: dict):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as fh:
+        np.savez_compressed(fh, labels=np.array(labels), **profiles)
+    os.replace(tmp, path)
+
+
+class LanguageDetector:
+    def __init__(self, path: str = PROFILES_PATH, min_confidence: float = MIN_CONFIDENCE):
+        self.path = path
+        self.min_confidence = min_confidence
+        self._lock = threading.Lock()
+        self._profiles = None
+        self.labels = []
+
+    def _load(self):
+        # read-only: the profiles ship with the code and are never rebuilt at runtime
+        if self._profiles is not None:
+            return self._profiles
+        with self._lock:
+            if self._profiles is None:
+                with np.load(self.path) as data:
+                    profiles = {key: data[key] for key in ("table", "scale", "offset")}
+                    self.labels = data["labels"].tolist()
+                self._profiles = profiles
+        return self._profiles
+
+    def detect_many(self, texts: list) -> list:
+        # one gather + segmented sum over the whole batch; texts without any
+        # letters come back as None
+        profiles = self._load()
+        results = [None] * len(texts)
+        features, weights, scored = [], [], []
+        for i, text in enumerate(texts):
+            ngrams = ngram_buckets(text or "")
+            if not len(ngrams):
+                continue
+            words = word_buckets(text)
+            features.append(np.concatenate([ngrams, words]))
+            weights.append(np.concatenate([np.ones(len(ngrams), dtype=np.float32),
+                                           np.full(len(words), WORD_WEIGHT, dtype=np.float32)]))
+            scored.append(i)
+        if not scored:
+            return results
+        lengths = np.array([len(f) for f in features])
+        offsets = np.concatenate(([0], np.cumsum(lengths[:-1])))
+        weights = np.concatenate(weights)
+        rows = profiles["table"][np.concatenate(features)].astype(np.float32) * weights[:, None]
+        total = np.add.reduceat(weights, offsets)[:, None]
+        # weighted mean log-probability, undoing the per-language quantization
+        scores = (np.add.reduceat(rows, offsets, axis=0) * profiles["scale"] + total * profiles["offset"]) / total
+        scores = scores * TEMPERATURE
+        scores -= scores.max(axis=1, keepdims=True)
+        probs = np.exp(scores)
+        probs /= probs.sum(axis=1, keepdims=True)
+        best = probs.argmax(axis=1)
+        for row, i in enumerate(scored):
+            results[i] = {"language": self.labels[best[row]],
+                          "confidence": round(float(probs[row, best[row]]), 4)}
+        return results
+
+    def detect(self, text: str) -> dict | None:
+        return self.detect_many([text])[0]
+
+    def resolve(self, text: str, source: str) -> str:
+        # the language to treat the text as: the caller's, or the detected one when "auto"
+        if source and source != "auto":
+            return source
+        result = self.detect(text)
+        if result and result["confidence"] >= self.min_confidence:
+            return result["language"]
+        return "auto"
+
+
+def same_language(a, b) -> bool:
+    if not isinstance(a, str) or not isinstance(b, str):
+        return False
+    a, b = a.lower(), b.lower()
+    if a == "auto" or b == "auto":
+        return False
+    # zh-cn and zh-tw are different targets; en-us and en are not
+    if a.startswith("zh") or b.startswith("zh"):
+        return a == b or {a, b} <= {"zh", "zh-cn"}
+    return a.split("-")[0] == b.split("-")[0]
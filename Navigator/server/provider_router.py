@@ -0,0 +1,191 @@
+# latency-aware provider routing with hedged requests for "auto" mode
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from providers import ProviderError
+
+HEDGE_DEFAULT_MS = float(os.getenv("NAVIGATOR_HEDGE_DEFAULT_MS", "300"))
+PROVIDER_TIMEOUT = float(os.getenv("NAVIGATOR_PROVIDER_TIMEOUT", "10"))
+# this many failures in a row take a provider out of auto routing for a while
+MAX_CONSECUTIVE_FAILURES = 3
+COOLDOWN_SECONDS = 30
+MIN_SAMPLES = 5
+
+
+class LatencyTracker:
+    def __init__(self, alpha: float = 0.2, window: int = 200):
+        self.alpha = alpha
+        self.samples = deque(maxlen=window)
+        self.ewma = None
+        self.calls = 0
+        self.errors = 0
+        self.wins = 0
+        self.cancelled = 0
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+
+    def _sample(self, elapsed_ms: float):
+        self.samples.append(elapsed_ms)
+        self.ewma = elapsed_ms if self.ewma is None else self.alpha * elapsed_ms + (1 - self.alpha) * self.ewma
+
+    def observe(self, elapsed_ms: float):
+        self.calls += 1
+        self.consecutive_failures = 0
+        self._sample(elapsed_ms)
+
+    def censored(self, elapsed_ms: float):
+        # a call abandoned after elapsed_ms (lost a hedge, timed out) would have
+        # taken at least that long; without this sample a provider that slows
+        # down keeps its old, fast estimate and stays ranked first
+        self._sample(max(elapsed_ms, self.p95() or 0.0))
+
+    def fail(self):
+        self.calls += 1
+        self.errors += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+            self.down_until = time.monotonic() + COOLDOWN_SECONDS
+
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def p95(self) -> float | None:
+        if len(self.samples) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def snapshot(self) -> dict:
+        p95 = self.p95()
+        return {
+            "calls": self.calls, "errors": self.errors, "wins": self.wins, "cancelled": self.cancelled,
+            "ewma_ms": round(self.ewma, 1) if self.ewma is not None else None,
+            "p95_ms": round(p95, 1) if p95 is not None else None,
+            "healthy": self.healthy(),
+        }
+
+
+class ProviderRouter:
+    def __init__(self, registry, hedge_default_ms: float = HEDGE_DEFAULT_MS,
+                 timeout: float = PROVIDER_TIMEOUT):
+        self.registry = registry
+        self.hedge_default_ms = hedge_default_ms
+        self.timeout = timeout
+        self.trackers = {name: LatencyTracker() for name in registry.names()}
+        self.hedges = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop = None
+
+    # the loop thread is started on first use so forked workers each get their own
+    def _ensure_loop(self):
+        if self._pid == os.getpid() and self._loop is not None:
+            return self._loop
+        with self._lock:
+            if self._pid != os.getpid() or self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="provider-loop", daemon=True).start()
+                self._loop = loop
+                self._pid = os.getpid()
+        return self._loop
+
+    def _tracker(self, name):
+        tracker = self.trackers.get(name)
+        if tracker is None:
+            tracker = self.trackers[name] = LatencyTracker()
+        return tracker
+
+    def ranked(self) -> list:
+        # fastest healthy provider first; providers without samples yet are tried first
+        healthy = [p for p in self.registry.all() if self._tracker(p.name).healthy()]
+        return sorted(healthy, key=lambda p: self._tracker(p.name).ewma or 0.0)
+
+    async def _timed(self, provider, text, source, target):
+        tracker = self._tracker(provider.name)
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(provider.translate(text, source, target), self.timeout)
+        except asyncio.CancelledError:
+            tracker.cancelled += 1
+            tracker.censored((time.perf_counter() - started) * 1000)
+            raise
+        except asyncio.TimeoutError:
+            tracker.fail()
+            tracker.censored((time.perf_counter() - started) * 1000)
+            raise
+        except Exception:
+            tracker.fail()
+            raise
+        tracker.observe((time.perf_counter() - started) * 1000)
+        return result
+
+    def _hedge_delay(self, provider) -> float:
+        return (self._tracker(provider.name).p95() or self.hedge_default_ms) / 1000
+
+    async def _auto(self, text, source, target):
+        # ask the fastest provider; if it has not answered within its own p95,
+        # also ask the next one. First good answer wins and the rest are cancelled.
+        queue = self.ranked()
+        if not queue:
+            raise ProviderError("No healthy provider available")
+        running = {}
+        errors = []
+        try:
+            while running or queue:
+                if not running:
+                    provider = queue.pop(0)
+                    running[asyncio.ensure_future(self._timed(provider, text, source, target))] = provider
+                newest = list(running.values())[-1]
+                done, _ = await asyncio.wait(
+                    running, timeout=self._hedge_delay(newest) if queue else None,
+                    return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedges += 1
+                    provider = queue.pop(0)
+                    running[asyncio.ensure_future(self._timed(provider, text, source, target))] = provider
+                    continue
+                for task in done:
+                    provider = running.pop(task)
+                    if task.exception() is None:
+                        self._tracker(provider.name).wins += 1
+                        return task.result(), provider.name
+                    # a timeout is an exception with an empty message
+                    errors.append(f"{provider.name}: {str(task.exception()) or 'timed out'}")
+            raise ProviderError("All providers failed: " + "; ".join(errors))
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def _single(self, provider, text, source, target):
+        result = await self._timed(provider, text, source, target)
+        self._tracker(provider.name).wins += 1
+        return result, provider.name
+
+    def translate(self, provider, text: str, source: str, target: str) -> tuple[str, str]:
+        # provider is a Provider, or None for auto routing; returns (text, provider used)
+        coro = self._auto(text, source, target) if provider is None else self._single(provider, text, source, target)
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        return future.result()
+
+    async def _fan_out(self, provider, text, source, targets):
+        return await asyncio.gather(
+            *(self._auto(text, source, t) if provider is None else self._single(provider, text, source, t)
+              for t in targets),
+            return_exceptions=True,
+        )
+
+    def translate_targets(self, provider, text: str, source: str, targets: list) -> list:
+        # every target concurrently on the router loop; each entry is
+        # (text, provider used) or the exception that target failed with
+        future = asyncio.run_coroutine_threadsafe(self._fan_out(provider, text, source, targets),
+                                                  self._ensure_loop())
+        return future.result()
+
+    def snapshot(self) -> dict:
+        return {
+            "hedges": self.hedges,
+            "ranking": [p.name for p in self.ranked()],
+            "providers": {name: tracker.snapshot() for name, tracker in self.trackers.items()},
+        }
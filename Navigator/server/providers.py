@@ -0,0 +1,76 @@
+# translation provider registry; real clients plug in through register()
+import os
+import random
+import asyncio
+from abc import ABC, abstractmethod
+
+
+class ProviderError(Exception):
+    pass
+
+
+class Provider(ABC):
+    name = ""
+
+    @abstractmethod
+    async def translate(self, text: str, source: str, target: str) -> str:
+        ...
+
+
+def _latency(key: str):
+    # NAVIGATOR_LATENCY_GOOGLE="80,250" -> uniform 80..250 ms; a single number is fixed
+    low, _, high = os.getenv(f"NAVIGATOR_LATENCY_{key}", "0").partition(",")
+    return float(low), float(high or low)
+
+
+class StandInProvider(Provider):
+    # local stand-in with configurable latency and failure rate, used until a
+    # real client is registered under the same name
+    def __init__(self, name: str, render, latency_ms=(0.0, 0.0), failure_rate: float = 0.0):
+        self.name = name
+        self.render = render
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+
+    async def translate(self, text: str, source: str, target: str) -> str:
+        await asyncio.sleep(random.uniform(*self.latency_ms) / 1000)
+        if random.random() < self.failure_rate:
+            raise ProviderError(f"{self.name} stand-in failed")
+        return self.render(text, target)
+
+
+class ProviderRegistry:
+    def __init__(self):
+        self._providers = {}
+
+    def register(self, provider: Provider):
+        self._providers[provider.name] = provider
+
+    def get(self, name: str) -> Provider | None:
+        return self._providers.get(name)
+
+    def names(self) -> list:
+        return list(self._providers)
+
+    def all(self) -> list:
+        return list(self._providers.values())
+
+
+def stand_in(name: str, key: str, render) -> StandInProvider:
+    return StandInProvider(name, render, _latency(key),
+                           float(os.getenv(f"NAVIGATOR_FAILURE_RATE_{key}", "0")))
+
+
+def default_registry() -> ProviderRegistry:
+    registry = ProviderRegistry()
+    registry.register(stand_in("ChatGPT/OpenAI", "OPENAI",
+                               lambda text, target: f"[OpenAI Flask Mock] Translation to {target}: {text}"))
+    registry.register(stand_in("Google", "GOOGLE",
+                               lambda text, target: f"[Google Flask Mock] Translation to {target}: {text.upper()}"))
+    registry.register(stand_in("Open Source", "OPEN_SOURCE",
+                               lambda text, target: f"[Open Source Flask Mock] {text} -> translated to {target}"))
+    return registry
+
+
+UNKNOWN_PROVIDER = StandInProvider(
+    "Unknown", lambda text, target: f"[Unknown Provider Mock] Translation to {target}: {text}")
@@ -0,0 +1,46 @@
+# python -m unittest test_provider_router
+import time
+import asyncio
+import unittest
+from providers import Provider, ProviderRegistry
+from provider_router import ProviderRouter
+
+
+class DelayProvider(Provider):
+    def __init__(self, name: str, delay_ms: float):
+        self.name = name
+        self.delay_ms = delay_ms
+
+    async def translate(self, text: str, source: str, target: str) -> str:
+        await asyncio.sleep(self.delay_ms / 1000)
+        return f"{self.name}:{text}"
+
+
+class DegradingProviderTest(unittest.TestCase):
+    def test_slowed_primary_loses_first_place(self):
+        fast, backup = DelayProvider("A", 10), DelayProvider("B", 50)
+        registry = ProviderRegistry()
+        registry.register(fast)
+        registry.register(backup)
+        router = ProviderRouter(registry, hedge_default_ms=100, timeout=5)
+
+        for _ in range(10):
+            router.translate(None, "hi", "auto", "fr")
+        self.assertEqual(router.snapshot()["ranking"][0], "A")
+
+        fast.delay_ms = 2000
+        winners = []
+        for _ in range(20):
+            winners.append(router.translate(None, "hi", "auto", "fr")[1])
+            time.sleep(0.01)  # let the cancelled hedge loser record its sample
+
+        snapshot = router.snapshot()
+        self.assertEqual(snapshot["ranking"][0], "B")
+        self.assertGreater(snapshot["providers"]["A"]["ewma_ms"], snapshot["providers"]["B"]["ewma_ms"])
+        # once B leads, calls stop waiting for A's hedge delay
+        self.assertLess(snapshot["hedges"], 20)
+        self.assertEqual(winners[-1], "B")
+
+
+if __name__ == "__main__":
+    unittest.main()
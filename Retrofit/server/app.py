@@ -1,7 +1,11 @@
 from flask import Flask, request, jsonify
+from batch_compute import (ExpressionError, compute_arrays, evaluate_vectorized,
+                           evaluate_many, cache_info)
 
 app = Flask(__name__)
 
+MAX_BATCH_SIZE = 100000
+
 @app.route('/add', methods=['GET', 'POST'])
 def add():
     a = 0
@@ -24,5 +28,44 @@ def add():
         'result': result
     })
 
+def batch_size(*values):
+    return max((len(v) for v in values if isinstance(v, (list, dict))), default=1)
+
+@app.route('/compute/batch', methods=['POST'])
+def compute_batch():
+    # one of:
+    #   {"op": "add", "a": [1, 2], "b": [3, 4]}            (b may be a single number)
+    #   {"expression": "a * b + 1", "variables": {"a": [...], "b": [...]}}
+    #   {"expressions": ["1 + 2", "sqrt(16) * 3"]}
+    data = request.get_json(silent=True) or {}
+
+    try:
+        if 'op' in data:
+            a, b = data.get('a', []), data.get('b', [])
+            if batch_size(a, b) > MAX_BATCH_SIZE:
+                return jsonify({'error': f'At most {MAX_BATCH_SIZE} operands per request'}), 413
+            return jsonify({'results': compute_arrays(data['op'], a, b)})
+
+        if 'expression' in data:
+            variables = data.get('variables') or {}
+            if not isinstance(variables, dict):
+                return jsonify({'error': 'variables must be an object'}), 400
+            if batch_size(*variables.values()) > MAX_BATCH_SIZE:
+                return jsonify({'error': f'At most {MAX_BATCH_SIZE} values per variable'}), 413
+            return jsonify({'results': evaluate_vectorized(str(data['expression']), variables)})
+
+        expressions = data.get('expressions')
+        if not isinstance(expressions, list):
+            return jsonify({'error': "Provide 'op', 'expression' or 'expressions'"}), 400
+        if len(expressions) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'At most {MAX_BATCH_SIZE} expressions per request'}), 413
+        return jsonify({'results': evaluate_many(expressions)})
+    except (ExpressionError, ArithmeticError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/compute/stats')
+def compute_stats():
+    return jsonify({'compile_cache': cache_info()})
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,142 @@
+# vectorized batch arithmetic and a safe expression evaluator for the calculator server
+import ast
+import math
+from functools import lru_cache
+import numpy as np
+
+MAX_EXPRESSION_LENGTH = 256
+
+OPS = {
+    "add": np.add,
+    "sub": np.subtract,
+    "mul": np.multiply,
+    "div": np.divide,
+    "pow": np.power,
+    "mod": np.mod,
+}
+
+FUNCTIONS = {
+    "sqrt": np.sqrt, "abs": np.abs, "exp": np.exp, "log": np.log, "log10": np.log10,
+    "sin": np.sin, "cos": np.cos, "tan": np.tan, "floor": np.floor, "ceil": np.ceil,
+    "round": np.round, "min": np.minimum, "max": np.maximum,
+}
+CONSTANTS = {"pi": math.pi, "e": math.e}
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant, ast.Name, ast.Load, ast.Call,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod, ast.FloorDiv, ast.UAdd, ast.USub,
+)
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+class _FloatConstants(ast.NodeTransformer):
+    # float literals keep 9**9**9 from turning into an endless big-int computation
+    def visit_Constant(self, node):
+        return ast.copy_location(ast.Constant(float(node.value)), node)
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(source: str):
+    # returns (code, variable names); only arithmetic, numbers, whitelisted
+    # functions and plain variable names make it through
+    if len(source) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError(f"Expression longer than {MAX_EXPRESSION_LENGTH} characters")
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError as e:
+        raise ExpressionError(f"Invalid expression: {e.msg}") from None
+    names = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise ExpressionError(f"Unsupported syntax: {type(node).__name__}")
+        if isinstance(node, ast.Constant) and (isinstance(node.value, bool)
+                                               or not isinstance(node.value, (int, float))):
+            raise ExpressionError(f"Unsupported literal: {node.value!r}")
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+                raise ExpressionError("Only sqrt, abs, exp, log, trig, rounding, min and max can be called")
+        elif isinstance(node, ast.Name) and node.id not in FUNCTIONS and node.id not in CONSTANTS:
+            names.add(node.id)
+    tree = ast.fix_missing_locations(_FloatConstants().visit(tree))
+    return compile(tree, "<expression>", "eval"), frozenset(names)
+
+
+def _evaluate(code, variables: dict):
+    scope = {"__builtins__": {}, **FUNCTIONS, **CONSTANTS, **variables}
+    try:
+        with np.errstate(all="ignore"):
+            return eval(code, scope)
+    except ArithmeticError:
+        # plain floats raise where numpy arrays give inf/nan (1/0, 10.0**400);
+        # either way the result is not finite and comes back as null
+        return np.nan
+    except TypeError:
+        # e.g. min() with three arguments; numpy's message is no help to callers
+        raise ExpressionError("Unsupported operands") from None
+
+
+def _to_json(values) -> list:
+    # non-finite results (x/0, sqrt(-1), overflow) become null
+    arr = np.asarray(values, dtype=np.float64)
+    out = arr.astype(object)
+    out[~np.isfinite(arr)] = None
+    return out.tolist()
+
+
+def compute_arrays(op: str, a, b) -> list:
+    # a and b are equal-length lists, or one of them a scalar that is broadcast
+    if op not in OPS:
+        raise ExpressionError(f"Unknown op '{op}', expected one of {', '.join(OPS)}")
+    try:
+        left, right = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ExpressionError("Operands must be numbers or lists of numbers") from None
+    if left.ndim > 1 or right.ndim > 1:
+        raise ExpressionError("Operands must be flat lists")
+    if left.ndim and right.ndim and left.shape != right.shape:
+        raise ExpressionError("Operand lists must have the same length")
+    with np.errstate(all="ignore"):
+        result = OPS[op](left, right)
+    return _to_json(np.atleast_1d(result))
+
+
+def evaluate_vectorized(source: str, variables: dict) -> list:
+    # one expression evaluated over whole columns of variable values at once
+    code, names = compile_expression(source)
+    unknown = names - set(variables)
+    if unknown:
+        raise ExpressionError(f"Unknown variables: {', '.join(sorted(unknown))}")
+    try:
+        columns = {name: np.asarray(variables[name], dtype=np.float64) for name in names}
+    except (TypeError, ValueError):
+        raise ExpressionError("Variable values must be numbers or lists of numbers") from None
+    lengths = {col.shape[0] for col in columns.values() if col.ndim == 1}
+    if len(lengths) > 1 or any(col.ndim > 1 for col in columns.values()):
+        raise ExpressionError("Variable lists must be flat and of the same length")
+    result = np.broadcast_to(_evaluate(code, columns), (lengths.pop() if lengths else 1,))
+    return _to_json(result)
+
+
+def evaluate_many(expressions: list) -> list:
+    # independent expressions; each one fails on its own
+    results = []
+    for source in expressions:
+        try:
+            if not isinstance(source, str):
+                raise ExpressionError("Expressions must be strings")
+            code, names = compile_expression(source)
+            if names:
+                raise ExpressionError(f"Unknown variables: {', '.join(sorted(names))}")
+            value = float(_evaluate(code, {}))
+            results.append({"result": value if math.isfinite(value) else None})
+        except ExpressionError as e:
+            results.append({"error": str(e)})
+    return results
+
+
+def cache_info() -> dict:
+    info = compile_expression.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
@@ -1,10 +1,12 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, request, jsonify, render_template_string, redirect, url_for, session
-from googletrans import Translator
+from translation_client import TranslationClient, TranslationTimeout
+from singleflight import SingleFlight
+from translation_cache import TranslationCache, normalize
 from authlib.integrations.flask_client import OAuth
 from dotenv import load_dotenv
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
+from token_verifier import TokenVerifier
 
 load_dotenv()
 
@@ -28,8 +30,17 @@ google = oauth.register(
         'scope': 'openid email profile'
     }
 )
+verifier = TokenVerifier(os.getenv("GOOGLE_CLIENT_ID"))
 
-translator = Translator()
+client = TranslationClient()
+cache = TranslationCache()
+flights = SingleFlight()
+
+MAX_TARGETS = 20
+
+# runs the blocking flights of one multi-target or batch request side by side
+FANOUT_WORKERS = int(os.getenv("TRANSLATE_FANOUT_WORKERS", "64"))
+fanout_pool = ThreadPoolExecutor(FANOUT_WORKERS, thread_name_prefix="fanout")
 
 HTML_PAGE = """
 <!DOCTYPE html>
@@ -176,8 +187,68 @@ def logout():
     session.clear()
     return redirect(url_for('home'))
 
+def _fetch_and_cache(text, dest, src):
+    translated = client.translate(text, dest, src=src)
+    cache.set(text, src, dest, translated)
+    return translated
+
+def translate_cached(text, dest, src='auto'):
+    translated = cache.get(text, src, dest)
+    if translated is None:
+        # concurrent misses for the same string share one upstream call
+        translated = flights.do((normalize(text), src, dest), _fetch_and_cache, text, dest, src)
+    return translated
+
+def translate_many(pairs, src='auto'):
+    # pairs is a list of (text, dest); identical entries are translated once.
+    # Misses share flights with translate_cached, so a string already being
+    # translated by another request is not sent upstream again
+    results, misses = {}, {}
+    for text, dest in pairs:
+        key = (normalize(text), dest)
+        if key in results or key in misses:
+            continue
+        cached = cache.get(text, src, dest)
+        if cached is not None:
+            results[key] = (cached, None)
+        else:
+            misses[key] = fanout_pool.submit(
+                flights.do, (key[0], src, dest), _fetch_and_cache, text, dest, src)
+    for key, future in misses.items():
+        try:
+            results[key] = (future.result(), None)
+        except Exception as e:
+            results[key] = (None, str(e))
+    return results, len(misses)
+
+def valid_targets(dests):
+    return (isinstance(dests, list) and 0 < len(dests) <= MAX_TARGETS
+            and all(isinstance(d, str) and d.strip() for d in dests))
+
+def multi_target_response(text, results):
+    body = {
+        'original_text': text,
+        'translations': {dest: t for dest, (t, error) in results.items() if error is None},
+    }
+    errors = {dest: error for dest, (t, error) in results.items() if error is not None}
+    if errors:
+        body['errors'] = errors
+    return body
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(cache.snapshot())
+
+@app.route('/auth/stats')
+def auth_stats():
+    return jsonify(verifier.snapshot())
+
+@app.route('/coalesce/stats')
+def coalesce_stats():
+    return jsonify(flights.snapshot())
+
 @app.route('/translate', methods=['POST'])
-async def translate_text():
+def translate_text():
     print("HEADERS RECEIVED:", request.headers) 
 
     user_email = None
@@ -186,11 +257,7 @@ async def translate_text():
     if auth_header and auth_header.startswith('Bearer '):
         token = auth_header.split(' ')[1]
         try:
-            idinfo = id_token.verify_oauth2_token(
-                token, 
-                google_requests.Request(), 
-                os.getenv("GOOGLE_CLIENT_ID")
-            )
+            idinfo = verifier.verify(token)
             user_email = idinfo.get('email')
         except ValueError as e:
             return jsonify({'error': f'Invalid token: {str(e)}'}), 401
@@ -207,14 +274,25 @@ async def translate_text():
             return jsonify({'error': 'No text provided'}), 400
 
         text_to_translate = data['text']
-        result = translator.translate(text_to_translate, dest='zh-cn')
+
+        # {"dests": ["zh-cn", "ja", ...]} translates into every listed language at once
+        if 'dests' in data:
+            if not valid_targets(data['dests']):
+                return jsonify({'error': f'dests must list 1 to {MAX_TARGETS} language codes'}), 400
+            results, _ = translate_many([(text_to_translate, dest) for dest in data['dests']])
+            key = normalize(text_to_translate)
+            results = {dest: results[(key, dest)] for dest in data['dests']}
+            return jsonify({**multi_target_response(text_to_translate, results), 'user': user_email})
+        translated_text = translate_cached(text_to_translate, 'zh-cn')
         
         return jsonify({
             'original_text': text_to_translate,
-            'translated_text': result.text,
+            'translated_text': translated_text,
             'user': user_email
         })
 
+    except TranslationTimeout as e:
+        return jsonify({'error': str(e)}), 504
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -0,0 +1,120 @@
+# verify Google ID tokens with one pooled session, cached signing certs and cached results
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, deque
+import requests
+from google.auth import jwt
+
+log = logging.getLogger(__name__)
+
+GOOGLE_CERTS_URL = os.getenv("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs")
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+TOKEN_CACHE_SIZE = int(os.getenv("ID_TOKEN_CACHE_SIZE", "10000"))
+CLOCK_SKEW = int(os.getenv("ID_TOKEN_CLOCK_SKEW", "10"))
+DEFAULT_CERTS_MAX_AGE = 300
+MIN_FORCED_REFRESH = 60
+
+MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+class TokenVerifier:
+    def __init__(self, audience: str | None, certs_url: str = GOOGLE_CERTS_URL,
+                 cache_size: int = TOKEN_CACHE_SIZE, session: requests.Session | None = None):
+        self.audience = audience
+        self.certs_url = certs_url
+        self.cache_size = cache_size
+        self._session = session or requests.Session()
+        self._certs = None
+        self._certs_expiry = 0.0
+        self._fetched_at = 0.0
+        self._certs_lock = threading.Lock()
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self.stats = {"verified": 0, "cache_hits": 0, "failures": 0, "cert_fetches": 0}
+
+    def _fetch_certs(self):
+        r = self._session.get(self.certs_url, timeout=5)
+        r.raise_for_status()
+        match = MAX_AGE.search(r.headers.get("Cache-Control", ""))
+        max_age = int(match.group(1)) if match else DEFAULT_CERTS_MAX_AGE
+        max_age -= int(r.headers.get("Age", "0") or 0)
+        self._certs = r.json()
+        self._fetched_at = time.time()
+        self._certs_expiry = self._fetched_at + max(max_age, 0)
+        with self._lock:
+            self.stats["cert_fetches"] += 1
+
+    def _get_certs(self, force: bool = False):
+        with self._certs_lock:
+            # unknown key ids can't make us hammer the cert endpoint
+            if force and time.time() - self._fetched_at < MIN_FORCED_REFRESH:
+                force = False
+            if force or self._certs is None or time.time() >= self._certs_expiry:
+                try:
+                    self._fetch_certs()
+                except (requests.RequestException, ValueError):
+                    # keep using the last good set through a cert endpoint outage
+                    if self._certs is None:
+                        raise
+                    log.warning("Could not refresh Google certs, using cached set", exc_info=True)
+            return self._certs
+
+    def _decode(self, token, certs):
+        claims = jwt.decode(token, certs=certs, audience=self.audience,
+                            clock_skew_in_seconds=CLOCK_SKEW)
+        if claims.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError(f"Wrong issuer. 'iss' should be one of the following: {GOOGLE_ISSUERS}")
+        return claims
+
+    def verify(self, token: str) -> dict:
+        key = hashlib.sha256(token.encode()).hexdigest()
+        with self._lock:
+            entry = self._tokens.get(key)
+            if entry is not None:
+                claims, expires_at = entry
+                if expires_at > time.time():
+                    self._tokens.move_to_end(key)
+                    self.stats["cache_hits"] += 1
+                    return dict(claims)
+                del self._tokens[key]
+
+        started = time.perf_counter()
+        try:
+            try:
+                claims = self._decode(token, self._get_certs())
+            except ValueError as e:
+                # a new signing key shows up before our cached set expires
+                if "key id" not in str(e).lower():
+                    raise
+                claims = self._decode(token, self._get_certs(force=True))
+        except ValueError:
+            with self._lock:
+                self.stats["failures"] += 1
+            raise
+
+        with self._lock:
+            self.stats["verified"] += 1
+            self._latencies.append(time.perf_counter() - started)
+            self._tokens[key] = (claims, float(claims["exp"]))
+            while len(self._tokens) > self.cache_size:
+                self._tokens.popitem(last=False)
+        return dict(claims)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["cached_tokens"] = len(self._tokens)
+            latencies = sorted(self._latencies)
+        if latencies:
+            stats["verify_ms"] = {
+                "p50": round(latencies[len(latencies) // 2] * 1000, 3),
+                "p95": round(latencies[int(len(latencies) * 0.95)] * 1000, 3),
+                "max": round(latencies[-1] * 1000, 3),
+            }
+        stats["certs_ttl"] = max(0, round(self._certs_expiry - time.time()))
+        return stats
@@ -0,0 +1,139 @@
+# two-tier translation cache: in-memory LRU with TTL in front of a shared SQLite store
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "5000"))
+CACHE_TTL = int(os.getenv("TRANSLATION_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_DB = os.getenv("TRANSLATION_CACHE_DB", "translation_cache.sqlite3")
+# expired rows are deleted from the shared store by a write at most this often per worker
+PURGE_INTERVAL = float(os.getenv("TRANSLATION_CACHE_PURGE_INTERVAL", "3600"))
+
+
+def normalize(text: str) -> str:
+    # spacing within a line doesn't matter, line breaks shape the translation
+    return "\n".join(" ".join(line.split()) for line in text.strip().splitlines())
+
+
+class TranslationCache:
+    def __init__(self, max_size: int = CACHE_SIZE, ttl: int = CACHE_TTL,
+                 db_path: str | None = CACHE_DB):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.db_path = db_path
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._db_pid = None
+        self._last_purge = time.time()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0,
+                      "evictions": 0, "expired": 0, "purged": 0}
+        if db_path:
+            self._db().execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                " src TEXT NOT NULL, dest TEXT NOT NULL, text TEXT NOT NULL,"
+                " translated TEXT NOT NULL, expires_at REAL NOT NULL,"
+                " PRIMARY KEY (src, dest, text))"
+            )
+
+    # sqlite connections can't be shared across threads, so keep one per thread;
+    # WAL lets every gunicorn worker read while another one writes
+    def _db(self):
+        if self._db_pid != os.getpid():
+            # forked: connections opened by the parent must not be used here
+            self._local = threading.local()
+            self._db_pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, text: str, src: str, dest: str) -> str | None:
+        key = (src, dest, normalize(text))
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._mem.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return value
+                del self._mem[key]
+                self.stats["expired"] += 1
+
+        if self.db_path:
+            try:
+                row = self._db().execute(
+                    "SELECT translated, expires_at FROM translations"
+                    " WHERE src = ? AND dest = ? AND text = ?", key
+                ).fetchone()
+            except sqlite3.Error:
+                row = None
+            if row is not None and row[1] > now:
+                self._remember(key, row[0], row[1])
+                with self._lock:
+                    self.stats["disk_hits"] += 1
+                return row[0]
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def set(self, text: str, src: str, dest: str, translated: str):
+        key = (src, dest, normalize(text))
+        expires_at = time.time() + self.ttl
+        self._remember(key, translated, expires_at)
+        if self.db_path:
+            try:
+                self._db().execute(
+                    "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)",
+                    (*key, translated, expires_at)
+                )
+            except sqlite3.Error:
+                # the memory tier still serves this worker; disk is best effort
+                pass
+            self._maybe_purge()
+
+    def _remember(self, key, value, expires_at):
+        with self._lock:
+            self._mem[key] = (value, expires_at)
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_size:
+                self._mem.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def purge_expired(self) -> int:
+        if not self.db_path:
+            return 0
+        cur = self._db().execute(
+            "DELETE FROM translations WHERE expires_at <= ?", (time.time(),)
+        )
+        with self._lock:
+            self.stats["purged"] += cur.rowcount
+        return cur.rowcount
+
+    def _maybe_purge(self):
+        with self._lock:
+            if time.time() - self._last_purge < PURGE_INTERVAL:
+                return
+            self._last_purge = time.time()
+        try:
+            self.purge_expired()
+        except sqlite3.Error:
+            pass
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["size"] = len(self._mem)
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["max_size"] = self.max_size
+        stats["ttl"] = self.ttl
+        stats["hit_rate"] = round((stats["hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,119 @@
+# async Google translate client sharing one keep-alive pool and one event loop per worker
+import os
+import asyncio
+import threading
+import httpx
+
+TRANSLATE_URL = os.getenv("TRANSLATE_URL", "https://translate.googleapis.com/translate_a/single")
+MAX_CONCURRENCY = int(os.getenv("TRANSLATE_MAX_CONCURRENCY", "200"))
+MAX_KEEPALIVE = int(os.getenv("TRANSLATE_MAX_KEEPALIVE", "50"))
+TIMEOUT = float(os.getenv("TRANSLATE_TIMEOUT", "10"))
+
+
+class TranslationError(Exception):
+    pass
+
+
+class TranslationTimeout(TranslationError):
+    pass
+
+
+class TranslationClient:
+    def __init__(self, url: str = TRANSLATE_URL, max_concurrency: int = MAX_CONCURRENCY,
+                 max_keepalive: int = MAX_KEEPALIVE, timeout: float = TIMEOUT):
+        self.url = url
+        self.max_concurrency = max_concurrency
+        self.max_keepalive = max_keepalive
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop = None
+        self._http = None
+        self._semaphore = None
+        self.in_flight = 0
+
+    # the loop thread is started on first use so forked workers each get their own
+    def _ensure_loop(self):
+        if self._pid == os.getpid() and self._loop is not None:
+            return self._loop
+        with self._lock:
+            if self._pid != os.getpid() or self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="translation-loop",
+                                 daemon=True).start()
+                self._loop = loop
+                self._http = None
+                self._semaphore = None
+                self._pid = os.getpid()
+        return self._loop
+
+    def _ensure_http(self):
+        # only ever called on the client's own loop
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_keepalive),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._http
+
+    async def _request(self, text: str, dest: str, src: str) -> str:
+        http = self._ensure_http()
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                r = await http.post(
+                    self.url,
+                    params={"client": "gtx", "sl": src, "tl": dest, "dt": "t"},
+                    data={"q": text},
+                )
+            finally:
+                self.in_flight -= 1
+        if r.status_code != 200:
+            raise TranslationError(f"Upstream returned HTTP {r.status_code}")
+        segments = r.json()[0] or []
+        return "".join(seg[0] for seg in segments if seg and seg[0])
+
+    async def atranslate(self, text: str, dest: str, src: str = "auto",
+                         timeout: float | None = None) -> str:
+        try:
+            return await asyncio.wait_for(self._request(text, dest, src),
+                                          timeout or self.timeout)
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            raise TranslationTimeout("Upstream translation timed out")
+        except httpx.HTTPError as e:
+            raise TranslationError(f"Upstream request failed: {e}")
+
+    async def atranslate_many(self, texts: list[str], dest: str, src: str = "auto",
+                              timeout: float | None = None) -> list:
+        # failures come back in place as exception objects
+        return await asyncio.gather(
+            *(self.atranslate(t, dest, src, timeout) for t in texts),
+            return_exceptions=True,
+        )
+
+    async def atranslate_pairs(self, pairs: list[tuple[str, str]], src: str = "auto",
+                               timeout: float | None = None) -> list:
+        # (text, dest) pairs with any mix of targets, all in flight at once
+        return await asyncio.gather(
+            *(self.atranslate(t, d, src, timeout) for t, d in pairs),
+            return_exceptions=True,
+        )
+
+    # blocking wrappers for WSGI handlers: the thread waits, the pool stays shared
+    def run(self, coro, timeout: float | None = None):
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        return future.result(timeout)
+
+    def translate(self, text: str, dest: str, src: str = "auto",
+                  timeout: float | None = None) -> str:
+        return self.run(self.atranslate(text, dest, src, timeout))
+
+    def translate_many(self, texts: list[str], dest: str, src: str = "auto",
+                       timeout: float | None = None) -> list:
+        return self.run(self.atranslate_many(texts, dest, src, timeout))
+
+    def translate_pairs(self, pairs: list[tuple[str, str]], src: str = "auto",
+                        timeout: float | None = None) -> list:
+        return self.run(self.atranslate_pairs(pairs, src, timeout))
@@ -1,27 +1,185 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, request, jsonify, render_template_string
-from googletrans import Translator
+from flask_sock import Sock
+from translation_client import TranslationClient, TranslationTimeout
+from singleflight import SingleFlight
+from translation_cache import TranslationCache, normalize
+from transcript_sessions import TranscriptSessions
+from stream_channel import StreamChannel, EchoTranslator
 
 app = Flask(__name__)
-translator = Translator()
+client = TranslationClient()
+cache = TranslationCache()
+flights = SingleFlight()
+
+MAX_TARGETS = 20
+
+# runs the blocking flights of one multi-target or batch request side by side
+FANOUT_WORKERS = int(os.getenv("TRANSLATE_FANOUT_WORKERS", "64"))
+fanout_pool = ThreadPoolExecutor(FANOUT_WORKERS, thread_name_prefix="fanout")
+
+sock = Sock(app)
+# "google" uses the real upstream, "echo" answers locally for offline testing
+STREAM_BACKEND = os.getenv("STREAM_BACKEND", "google")
+STREAM_WORKERS = int(os.getenv("STREAM_WORKERS", "32"))
+# shared by every WebSocket so total upstream concurrency stays bounded
+stream_pool = ThreadPoolExecutor(STREAM_WORKERS, thread_name_prefix="stream")
+echo_translator = EchoTranslator()
+
+def _fetch_and_cache(text, dest, src):
+    translated = client.translate(text, dest, src=src)
+    cache.set(text, src, dest, translated)
+    return translated
+
+def translate_cached(text, dest, src='auto'):
+    translated = cache.get(text, src, dest)
+    if translated is None:
+        # concurrent misses for the same string share one upstream call
+        translated = flights.do((normalize(text), src, dest), _fetch_and_cache, text, dest, src)
+    return translated
+
+def translate_many(pairs, src='auto'):
+    # pairs is a list of (text, dest); identical entries are translated once.
+    # Misses share flights with translate_cached, so a string already being
+    # translated by another request is not sent upstream again
+    results, misses = {}, {}
+    for text, dest in pairs:
+        key = (normalize(text), dest)
+        if key in results or key in misses:
+            continue
+        cached = cache.get(text, src, dest)
+        if cached is not None:
+            results[key] = (cached, None)
+        else:
+            misses[key] = fanout_pool.submit(
+                flights.do, (key[0], src, dest), _fetch_and_cache, text, dest, src)
+    for key, future in misses.items():
+        try:
+            results[key] = (future.result(), None)
+        except Exception as e:
+            results[key] = (None, str(e))
+    return results, len(misses)
+
+def translate_segments(texts, dest, cacheable, src='auto'):
+    # finalized sentences go through the cache; the volatile tail is never cached
+    results = [cache.get(text, src, dest) if cacheable else None for text in texts]
+    missing = [i for i, r in enumerate(results) if r is None]
+    if missing:
+        translated = client.translate_pairs([(texts[i], dest) for i in missing], src=src)
+        for i, result in zip(missing, translated):
+            if isinstance(result, Exception):
+                raise result
+            if cacheable:
+                cache.set(texts[i], src, dest, result)
+            results[i] = result
+    return results
+
+sessions = TranscriptSessions(translate_segments)
+
+def valid_targets(dests):
+    return (isinstance(dests, list) and 0 < len(dests) <= MAX_TARGETS
+            and all(isinstance(d, str) and d.strip() for d in dests))
+
+def multi_target_response(text, results):
+    body = {
+        'original_text': text,
+        'translations': {dest: t for dest, (t, error) in results.items() if error is None},
+    }
+    errors = {dest: error for dest, (t, error) in results.items() if error is not None}
+    if errors:
+        body['errors'] = errors
+    return body
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(cache.snapshot())
+
+@app.route('/coalesce/stats')
+def coalesce_stats():
+    return jsonify(flights.snapshot())
 
 @app.route('/translate', methods=['POST'])
-async def translate_text():
+def translate_text():
     try:
         data = request.get_json(force=True)
         if not data or 'text' not in data:
             return jsonify({'error': 'No text provided'}), 400
 
         text_to_translate = data['text']
+
+        # {"dests": ["zh-cn", "ja", ...]} translates into every listed language at once
+        if 'dests' in data:
+            if not valid_targets(data['dests']):
+                return jsonify({'error': f'dests must list 1 to {MAX_TARGETS} language codes'}), 400
+            results, _ = translate_many([(text_to_translate, dest) for dest in data['dests']])
+            key = normalize(text_to_translate)
+            results = {dest: results[(key, dest)] for dest in data['dests']}
+            return jsonify(multi_target_response(text_to_translate, results))
         
-        result = translator.translate(text_to_translate, dest='zh-cn')
+        translated_text = translate_cached(text_to_translate, 'zh-cn')
         
         return jsonify({
             'original_text': text_to_translate,
-            'translated_text': result.text
+            'translated_text': translated_text
         })
 
+    except TranslationTimeout as e:
+        return jsonify({'error': str(e)}), 504
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/translate/session', methods=['POST'])
+def translate_session():
+    # live transcripts: {"session_id"?, "text": <whole transcript so far>} or
+    # {"session_id", "append": <new fragment>}; "final": true closes the utterance
+    data = request.get_json(force=True, silent=True)
+    if not isinstance(data, dict):
+        data = {}
+    text, append = data.get('text'), data.get('append')
+    if not isinstance(text, str) and not isinstance(append, str):
+        return jsonify({'error': 'Provide text or append'}), 400
+    if isinstance(text, str) and isinstance(append, str):
+        return jsonify({'error': 'Provide either text or append, not both'}), 400
+    dest = data.get('dest', 'zh-cn')
+    if not isinstance(dest, str) or not dest.strip():
+        return jsonify({'error': 'dest must be a language code'}), 400
+    session_id = data.get('session_id')
+    if session_id is not None and not isinstance(session_id, str):
+        return jsonify({'error': 'session_id must be a string'}), 400
+
+    # appending to a session that expired would silently drop the earlier speech
+    session = sessions.get(session_id, dest, create=not isinstance(append, str))
+    if session is None:
+        return jsonify({'error': 'Unknown or expired session_id; resend the whole transcript as text'}), 404
+    try:
+        result = sessions.update(session, text=text if isinstance(text, str) else None,
+                                 append=append if isinstance(append, str) else None,
+                                 final=bool(data.get('final')))
+    except TranslationTimeout as e:
+        return jsonify({'error': str(e), 'session_id': session.id}), 504
+    except Exception as e:
+        return jsonify({'error': str(e), 'session_id': session.id}), 500
+    return jsonify(result)
+
+@app.route('/translate/session/<session_id>', methods=['DELETE'])
+def end_session(session_id):
+    return jsonify({'ended': sessions.end(session_id)})
+
+@app.route('/session/stats')
+def session_stats():
+    return jsonify(sessions.snapshot())
+
+@sock.route('/ws/translate')
+def ws_translate(ws):
+    # ?dest=ja&credits=8&backend=echo; the message protocol is described in stream_channel.py
+    backend = request.args.get('backend', STREAM_BACKEND)
+    translate = echo_translator if backend == 'echo' else translate_cached
+    try:
+        credits = int(request.args['credits']) if 'credits' in request.args else None
+    except ValueError:
+        credits = None
+    StreamChannel(ws, translate, stream_pool, dest=request.args.get('dest', 'zh-cn'), credits=credits).serve()
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,159 @@
+# one long-lived WebSocket per conversation: fragments in, sequenced translations out, with credit-based flow control
+import os
+import json
+import time
+import queue
+import threading
+from collections import deque
+from simple_websocket import ConnectionClosed
+
+MAX_PENDING = int(os.getenv("STREAM_MAX_PENDING", "16"))
+ECHO_DELAY_MS = float(os.getenv("STREAM_ECHO_DELAY_MS", "0"))
+MAX_FRAGMENT_CHARS = 5000
+
+
+class EchoTranslator:
+    # offline stand-in for the upstream translator
+    def __init__(self, delay_ms: float = ECHO_DELAY_MS):
+        self.delay_ms = delay_ms
+
+    def __call__(self, text: str, dest: str) -> str:
+        if self.delay_ms:
+            time.sleep(self.delay_ms / 1000)
+        return f"[{dest}] {text}"
+
+
+class StreamChannel:
+    # Client -> server:
+    #   {"type": "fragment", "seq": 1, "text": "...", "dest": "ja"?}
+    #   {"type": "credit", "n": 8}        allow the server to send n more results
+    #   {"type": "ping"}
+    # Server -> client:
+    #   {"type": "ready", "max_pending": 16, "credits": 16}
+    #   {"type": "translation", "seq": 1, "text": "..."} or {"type": "error", "seq": 1, "error": "..."}
+    #   {"type": "pong"}
+    #
+    # Flow control works both ways without ever blocking the reader, so credit
+    # messages are always seen:
+    # - results go out as soon as they are ready, tagged with the fragment's
+    #   seq, and only while the client has credits;
+    # - the client may have at most max_pending fragments without a result yet.
+    #   Fragments beyond that window are rejected with "retry": true instead of
+    #   queueing without bound.
+    def __init__(self, ws, translate, pool, dest: str = "zh-cn",
+                 max_pending: int = MAX_PENDING, credits: int | None = None):
+        self.ws = ws
+        self.translate = translate
+        self.pool = pool
+        self.dest = dest
+        self.max_pending = max_pending
+        self.credits = max_pending if credits is None else credits
+        self.last_seq = 0
+        self.pending = 0
+        self.stats = {"fragments": 0, "sent": 0, "errors": 0, "rejected": 0}
+        self._outbox = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+    def serve(self):
+        sender = threading.Thread(target=self._send_loop, name="stream-sender", daemon=True)
+        sender.start()
+        self._outbox.put(("control", {"type": "ready", "max_pending": self.max_pending,
+                                      "credits": self.credits}))
+        try:
+            while not self._closed.is_set():
+                raw = self.ws.receive()
+                if raw is None:
+                    break
+                self._handle(raw)
+        except ConnectionClosed:
+            pass
+        finally:
+            self._close()
+            sender.join(timeout=5)
+        return self.stats
+
+    def _close(self):
+        self._closed.set()
+        self._outbox.put(None)
+
+    def _reject(self, seq, error, retry=False):
+        self.stats["rejected"] += 1
+        message = {"type": "error", "seq": seq, "error": error}
+        if retry:
+            message["retry"] = True
+        self._outbox.put(("control", message))
+
+    def _handle(self, raw):
+        try:
+            msg = json.loads(raw)
+        except (TypeError, ValueError):
+            return self._reject(None, "Messages must be JSON")
+        if not isinstance(msg, dict):
+            return self._reject(None, "Messages must be JSON objects")
+
+        kind = msg.get("type")
+        if kind == "ping":
+            self._outbox.put(("control", {"type": "pong"}))
+        elif kind == "credit":
+            n = msg.get("n")
+            if not isinstance(n, int) or n <= 0:
+                return self._reject(None, "credit n must be a positive integer")
+            with self._lock:
+                self.credits += n
+            self._outbox.put(("credit",))
+        elif kind == "fragment":
+            self._fragment(msg)
+        else:
+            self._reject(msg.get("seq"), f"Unknown message type {kind!r}")
+
+    def _fragment(self, msg):
+        seq, text = msg.get("seq"), msg.get("text")
+        if not isinstance(seq, int) or seq <= self.last_seq:
+            return self._reject(seq, f"seq must be an integer above {self.last_seq}")
+        if not isinstance(text, str) or not text.strip() or len(text) > MAX_FRAGMENT_CHARS:
+            return self._reject(seq, f"text must be 1 to {MAX_FRAGMENT_CHARS} characters")
+        with self._lock:
+            if self.pending >= self.max_pending:
+                return self._reject(seq, f"More than {self.max_pending} fragments in flight", retry=True)
+            self.pending += 1
+        self.last_seq = seq
+        self.stats["fragments"] += 1
+        future = self.pool.submit(self.translate, text, msg.get("dest") or self.dest)
+        future.add_done_callback(lambda f, seq=seq: self._outbox.put(("result", seq, f)))
+
+    def _send_loop(self):
+        # the only thread writing to the socket. Control messages go out at
+        # once; results wait here (not in the outbox) while credits are spent,
+        # so pongs and rejections are never stuck behind them.
+        ready = deque()
+        while True:
+            item = self._outbox.get()
+            if item is None:
+                return
+            try:
+                if item[0] == "control":
+                    self.ws.send(json.dumps(item[1], ensure_ascii=False))
+                elif item[0] == "result":
+                    ready.append(item[1:])
+                while ready:
+                    with self._lock:
+                        if self.credits <= 0:
+                            break
+                        self.credits -= 1
+                    self._send_result(*ready.popleft())
+            except ConnectionClosed:
+                self._closed.set()
+                return
+
+    def _send_result(self, seq, future):
+        error = future.exception()
+        if error is None:
+            message = {"type": "translation", "seq": seq, "text": future.result()}
+            self.stats["sent"] += 1
+        else:
+            message = {"type": "error", "seq": seq, "error": str(error) or type(error).__name__}
+            self.stats["errors"] += 1
+        self.ws.send(json.dumps(message, ensure_ascii=False))
+        with self._lock:
+            self.pending -= 1
@@ -0,0 +1,134 @@
+# per-session state for live transcripts: finalized sentences are translated once, only the tail is redone
+import os
+import re
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+SESSION_TTL = float(os.getenv("TRANSCRIPT_SESSION_TTL", "900"))
+MAX_SESSIONS = int(os.getenv("TRANSCRIPT_MAX_SESSIONS", "1000"))
+
+# sentence ends: Latin terminators need whitespace after them, so "3.5" and
+# "example.com" do not split; CJK terminators end a sentence on their own
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+|[。！？]+[\"')\]」』]*\s*")
+
+
+def split_transcript(text: str) -> tuple[list, str]:
+    # returns (finalized sentences, volatile tail); a sentence is final once
+    # more speech follows its end
+    sentences = []
+    pos = 0
+    for match in _SENTENCE_END.finditer(text):
+        if match.end() == len(text):
+            break
+        sentences.append(text[pos:match.end()].strip())
+        pos = match.end()
+    return [s for s in sentences if s], text[pos:].strip()
+
+
+def joiner(dest: str) -> str:
+    return "" if dest.split("-")[0] in ("zh", "ja") else " "
+
+
+class TranscriptSession:
+    def __init__(self, session_id: str, dest: str):
+        self.id = session_id
+        self.dest = dest
+        self.transcript = ""
+        self.finalized = []  # (source sentence, translation)
+        self.tail = ("", "")
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+
+class TranscriptSessions:
+    def __init__(self, translate_segments, ttl: float = SESSION_TTL, max_sessions: int = MAX_SESSIONS):
+        # translate_segments(texts, dest, cacheable) -> translations, in order
+        self.translate_segments = translate_segments
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"updates": 0, "sentences_reused": 0, "sentences_translated": 0,
+                      "tail_translations": 0, "expired": 0}
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if len(self._sessions) <= self.max_sessions and now - oldest.updated < self.ttl:
+                break
+            self._sessions.popitem(last=False)
+            self.stats["expired"] += 1
+
+    def get(self, session_id: str | None, dest: str, create: bool = True) -> TranscriptSession | None:
+        # None when session_id is unknown or expired and create is False
+        with self._lock:
+            self._evict()
+            session = self._sessions.get(session_id) if session_id else None
+            if session is None and session_id and not create:
+                return None
+            if session is None or session.dest != dest:
+                replaced = session
+                session = TranscriptSession(session_id or uuid.uuid4().hex, dest)
+                if replaced is not None:
+                    # new target language: keep what was said, translate it again
+                    session.transcript = replaced.transcript
+                self._sessions[session.id] = session
+            self._sessions.move_to_end(session.id)
+            return session
+
+    def end(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def update(self, session: TranscriptSession, text: str | None = None,
+               append: str | None = None, final: bool = False) -> dict:
+        # text replaces the whole transcript (ASR partials may revise earlier
+        # words); append adds a fragment to what the session already holds
+        with session.lock:
+            transcript = text if text is not None else (session.transcript + (append or ""))
+            sentences, tail = split_transcript(transcript)
+            if final and tail:
+                sentences, tail = sentences + [tail], ""
+
+            reused = 0
+            while (reused < len(sentences) and reused < len(session.finalized)
+                   and session.finalized[reused][0] == sentences[reused]):
+                reused += 1
+            fresh = sentences[reused:]
+            translated = self.translate_segments(fresh, session.dest, True) if fresh else []
+            if not tail:
+                tail_translation = ""
+            elif tail == session.tail[0]:
+                tail_translation = session.tail[1]
+            else:
+                tail_translation = self.translate_segments([tail], session.dest, False)[0]
+                with self._lock:
+                    self.stats["tail_translations"] += 1
+
+            session.finalized = session.finalized[:reused] + list(zip(fresh, translated))
+            session.tail = (tail, tail_translation)
+            session.transcript = transcript
+            session.updated = time.monotonic()
+            with self._lock:
+                self.stats["updates"] += 1
+                self.stats["sentences_reused"] += reused
+                self.stats["sentences_translated"] += len(fresh)
+
+            parts = [t for _, t in session.finalized] + ([tail_translation] if tail_translation else [])
+            return {
+                "session_id": session.id,
+                "translated_text": joiner(session.dest).join(parts),
+                "finalized": [t for _, t in session.finalized],
+                "tail": tail_translation,
+                "translated_sentences": len(fresh),
+                "reused_sentences": reused,
+            }
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["sessions"] = len(self._sessions)
+        return stats
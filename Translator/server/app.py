@@ -1,8 +1,21 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, request, jsonify, render_template_string
-from googletrans import Translator
+from translation_client import TranslationClient, TranslationTimeout
+from singleflight import SingleFlight
+from translation_cache import TranslationCache, normalize
 
 app = Flask(__name__)
-translator = Translator()
+client = TranslationClient()
+cache = TranslationCache()
+flights = SingleFlight()
+
+MAX_BATCH_SIZE = 200
+MAX_TARGETS = 20
+
+# runs the blocking flights of one multi-target or batch request side by side
+FANOUT_WORKERS = int(os.getenv("TRANSLATE_FANOUT_WORKERS", "64"))
+fanout_pool = ThreadPoolExecutor(FANOUT_WORKERS, thread_name_prefix="fanout")
 
 HTML_PAGE = """
 <!DOCTYPE html>
@@ -156,24 +169,137 @@ HTML_PAGE = """
 def home():
     return render_template_string(HTML_PAGE)
 
+def _fetch_and_cache(text, dest, src):
+    translated = client.translate(text, dest, src=src)
+    cache.set(text, src, dest, translated)
+    return translated
+
+def translate_cached(text, dest, src='auto'):
+    translated = cache.get(text, src, dest)
+    if translated is None:
+        # concurrent misses for the same string share one upstream call
+        translated = flights.do((normalize(text), src, dest), _fetch_and_cache, text, dest, src)
+    return translated
+
+def valid_targets(dests):
+    return (isinstance(dests, list) and 0 < len(dests) <= MAX_TARGETS
+            and all(isinstance(d, str) and d.strip() for d in dests))
+
+def multi_target_response(text, results):
+    body = {
+        'original_text': text,
+        'translations': {dest: t for dest, (t, error) in results.items() if error is None},
+    }
+    errors = {dest: error for dest, (t, error) in results.items() if error is not None}
+    if errors:
+        body['errors'] = errors
+    return body
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(cache.snapshot())
+
+@app.route('/coalesce/stats')
+def coalesce_stats():
+    return jsonify(flights.snapshot())
+
 @app.route('/translate', methods=['POST'])
-async def translate_text():
+def translate_text():
     try:
         data = request.get_json(force=True)
         if not data or 'text' not in data:
             return jsonify({'error': 'No text provided'}), 400
 
         text_to_translate = data['text']
-        
-        result = translator.translate(text_to_translate, dest='zh-cn')
+
+        # {"dests": ["zh-cn", "ja", ...]} translates into every listed language at once
+        if 'dests' in data:
+            if not valid_targets(data['dests']):
+                return jsonify({'error': f'dests must list 1 to {MAX_TARGETS} language codes'}), 400
+            results, _ = translate_many([(text_to_translate, dest) for dest in data['dests']])
+            key = normalize(text_to_translate)
+            return jsonify(multi_target_response(
+                text_to_translate, {dest: results[(key, dest)] for dest in data['dests']}))
+
+        translated_text = translate_cached(text_to_translate, 'zh-cn')
         
         return jsonify({
             'original_text': text_to_translate,
-            'translated_text': result.text
+            'translated_text': translated_text
         })
 
+    except TranslationTimeout as e:
+        return jsonify({'error': str(e)}), 504
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def translate_many(pairs, src='auto'):
+    # pairs is a list of (text, dest); identical entries are translated once.
+    # Misses share flights with translate_cached, so a string already being
+    # translated by another request is not sent upstream again
+    results, misses = {}, {}
+    for text, dest in pairs:
+        key = (normalize(text), dest)
+        if key in results or key in misses:
+            continue
+        cached = cache.get(text, src, dest)
+        if cached is not None:
+            results[key] = (cached, None)
+        else:
+            misses[key] = fanout_pool.submit(
+                flights.do, (key[0], src, dest), _fetch_and_cache, text, dest, src)
+    for key, future in misses.items():
+        try:
+            results[key] = (future.result(), None)
+        except Exception as e:
+            results[key] = (None, str(e))
+    return results, len(misses)
+
+def batch_item_error(text, dest):
+    if not isinstance(text, str) or not text.strip():
+        return 'No text provided'
+    if not isinstance(dest, str) or not dest.strip():
+        return 'dest must be a language code'
+    return None
+
+@app.route('/translate/batch', methods=['POST'])
+def translate_batch():
+    data = request.get_json(force=True, silent=True)
+    if not data or not isinstance(data.get('texts'), list) or not data['texts']:
+        return jsonify({'error': 'No texts provided'}), 400
+    if len(data['texts']) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'At most {MAX_BATCH_SIZE} texts per batch'}), 400
+
+    default_dest = data.get('dest', 'zh-cn')
+    if not isinstance(default_dest, str) or not default_dest.strip():
+        return jsonify({'error': 'dest must be a language code'}), 400
+    items = []
+    for entry in data['texts']:
+        if isinstance(entry, dict):
+            items.append((entry.get('text'), entry.get('dest') or default_dest))
+        else:
+            items.append((entry, default_dest))
+
+    valid = [(text, dest) for text, dest in items if batch_item_error(text, dest) is None]
+    results, upstream_calls = translate_many(valid)
+
+    out = []
+    for text, dest in items:
+        error = batch_item_error(text, dest)
+        if error:
+            out.append({'original_text': text, 'dest': dest, 'error': error})
+            continue
+        translated, error = results[(normalize(text), dest)]
+        if error:
+            out.append({'original_text': text, 'dest': dest, 'error': error})
+        else:
+            out.append({'original_text': text, 'dest': dest, 'translated_text': translated})
+
+    return jsonify({
+        'results': out,
+        'unique': len(results),
+        'upstream_calls': upstream_calls
+    })
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,42 @@
+# collapse concurrent identical calls into one: the first caller runs it, the rest wait for its result
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {"calls": 0, "executed": 0, "collapsed": 0, "errors": 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            self.stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+                self.stats["executed"] += 1
+            else:
+                self.stats["collapsed"] += 1
+
+        if not leader:
+            return call.result()
+
+        try:
+            call.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            call.set_exception(e)
+        finally:
+            # later callers start a fresh flight instead of reusing a finished one
+            with self._lock:
+                del self._calls[key]
+        return call.result()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = len(self._calls)
+        return stats
@@ -1,7 +1,15 @@
 import os
-from flask import Flask, request, jsonify, render_template_string
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Flask, Response, request, jsonify, render_template_string, stream_with_context
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from dotenv import load_dotenv
+from singleflight import SingleFlight
+from microbatch import MicroBatcher, estimate_tokens
+from rate_limiter import AdmissionScheduler, Overloaded, usage_tokens, PRIORITY_INTERACTIVE, PRIORITY_BULK
+from chunking import split_document
 
 load_dotenv()
 
@@ -9,6 +17,16 @@ app = Flask(__name__)
 
 genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
 model = genai.GenerativeModel('gemini-2.5-flash')
+flights = SingleFlight()
+scheduler = AdmissionScheduler(retry_on=(google_exceptions.ResourceExhausted,))
+
+QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+MAX_TARGETS = 10
+
+DOC_CHUNK_TOKENS = int(os.getenv("LLM_DOC_CHUNK_TOKENS", "800"))
+DOC_MAX_WORKERS = int(os.getenv("LLM_DOC_MAX_WORKERS", "8"))
+# shared by every document request so total Gemini concurrency stays bounded
+doc_pool = ThreadPoolExecutor(DOC_MAX_WORKERS, thread_name_prefix="llm-doc")
 
 HTML_PAGE = """
 <!DOCTYPE html>
@@ -132,19 +150,53 @@ HTML_PAGE = """
             btn.innerText = "Translating...";
             btn.style.opacity = "0.7";
             
+            resultDiv.innerText = "";
+
             try {
-                const response = await fetch('/translate', {
+                // stream the translation as Server-Sent Events so long texts render as they arrive
+                const response = await fetch('/translate/stream', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
                     body: JSON.stringify({ text: textInput.value })
                 });
-                
-                const data = await response.json();
-                
-                if (data.translated_text) {
-                    resultDiv.innerText = data.translated_text;
-                } else {
+
+                if (!response.ok) {
+                    const data = await response.json();
                     resultDiv.innerText = "Error: " + (data.error || "Unknown error");
+                    return;
+                }
+
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = "";
+
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+                    buffer += decoder.decode(value, { stream: true });
+
+                    let boundary;
+                    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+                        const message = buffer.slice(0, boundary);
+                        buffer = buffer.slice(boundary + 2);
+
+                        let event = "message";
+                        let payload = "";
+                        for (const line of message.split("\n")) {
+                            if (line.startsWith("event:")) event = line.slice(6).trim();
+                            else if (line.startsWith("data:")) payload += line.slice(5).trim();
+                        }
+                        if (!payload) continue;
+
+                        const data = JSON.parse(payload);
+                        if (event === "error") {
+                            resultDiv.innerText = "Error: " + (data.error || "Unknown error");
+                        } else if (event === "done") {
+                            resultDiv.innerText = data.translated_text;
+                        } else {
+                            resultDiv.innerText += data.delta;
+                        }
+                    }
                 }
             } catch (err) {
                 resultDiv.innerText = err;
@@ -162,6 +214,101 @@ HTML_PAGE = """
 def home():
     return render_template_string(HTML_PAGE)
 
+def build_prompt(text):
+    return f"Translate the following English text to Simplified Chinese. Only output the translated text and nothing else:\n{text}"
+
+def estimate_call_tokens(prompt):
+    # the prompt plus a translation of roughly the same length
+    return estimate_tokens(prompt) * 2
+
+def generate(prompt, priority=PRIORITY_INTERACTIVE, tokens=None, **kwargs):
+    # every Gemini call goes through the admission scheduler
+    return scheduler.call(
+        lambda: model.generate_content(prompt, **kwargs),
+        tokens or estimate_call_tokens(prompt),
+        priority=priority,
+        deadline=time.monotonic() + QUEUE_TIMEOUT
+    )
+
+def translate_llm(text, priority=PRIORITY_INTERACTIVE):
+    response = generate(build_prompt(text), priority)
+    return response.text.strip()
+
+def build_batch_prompt(texts):
+    return (
+        "Translate each English string in the JSON array below to Simplified Chinese. "
+        f"Respond with a JSON array of exactly {len(texts)} strings holding the translations "
+        "in the same order, and nothing else:\n"
+        + json.dumps(texts, ensure_ascii=False)
+    )
+
+def translate_llm_batch(texts):
+    response = generate(
+        build_batch_prompt(texts),
+        generation_config={'response_mime_type': 'application/json'}
+    )
+    try:
+        translations = json.loads(response.text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"batch response is not JSON: {e}")
+    if not isinstance(translations, list) or not all(isinstance(t, str) for t in translations):
+        raise ValueError("batch response is not a list of strings")
+    return [t.strip() for t in translations]
+
+batcher = MicroBatcher(translate_llm_batch, translate_llm)
+
+def build_multi_target_prompt(text, targets):
+    return (
+        "Translate the English text below into each of these languages: "
+        + "; ".join(targets)
+        + ". Respond with a JSON object that maps each language, written exactly as listed, "
+        "to its translation, and nothing else:\n"
+        + text
+    )
+
+def translate_llm_targets(text, targets):
+    # every target language from one prompt; returns {target: (translation, error)}
+    prompt = build_multi_target_prompt(text, targets)
+    response = generate(
+        prompt,
+        tokens=estimate_tokens(prompt) + estimate_tokens(text) * len(targets),
+        generation_config={'response_mime_type': 'application/json'}
+    )
+    try:
+        translations = json.loads(response.text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"multi-target response is not JSON: {e}")
+    if not isinstance(translations, dict):
+        raise ValueError("multi-target response is not a JSON object")
+    by_name = {str(k).strip().lower(): v for k, v in translations.items()}
+    results = {}
+    for target in targets:
+        value = by_name.get(target.strip().lower())
+        if isinstance(value, str):
+            results[target] = (value.strip(), None)
+        else:
+            results[target] = (None, "Missing from model response")
+    return results
+
+def overloaded(e):
+    return jsonify({'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
+
+def sse(data, event=None):
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/coalesce/stats')
+def coalesce_stats():
+    return jsonify(flights.snapshot())
+
+@app.route('/batching/stats')
+def batching_stats():
+    return jsonify(batcher.snapshot())
+
+@app.route('/ratelimit/stats')
+def ratelimit_stats():
+    return jsonify(scheduler.snapshot())
+
 @app.route('/translate', methods=['POST'])
 def translate_text():
     try:
@@ -170,18 +317,128 @@ def translate_text():
             return jsonify({'error': 'No text provided'}), 400
 
         text_to_translate = data['text']
-        
-        prompt = f"Translate the following English text to Simplified Chinese. Only output the translated text and nothing else:\n{text_to_translate}"
-        
-        response = model.generate_content(prompt)
+
+        # {"dests": ["Japanese", "French", ...]} gets every language from a single prompt
+        if 'dests' in data:
+            dests = data['dests']
+            if not (isinstance(dests, list) and 0 < len(dests) <= MAX_TARGETS
+                    and all(isinstance(d, str) and d.strip() for d in dests)):
+                return jsonify({'error': f'dests must list 1 to {MAX_TARGETS} languages'}), 400
+            dests = list(dict.fromkeys(dests))
+            results = flights.do((text_to_translate, tuple(dests)), translate_llm_targets, text_to_translate, dests)
+            body = {
+                'original_text': text_to_translate,
+                'translations': {d: t for d, (t, error) in results.items() if error is None},
+            }
+            errors = {d: error for d, (t, error) in results.items() if error is not None}
+            if errors:
+                body['errors'] = errors
+            return jsonify(body)
+
+        # identical requests arriving together share one Gemini call, and short
+        # ones are packed with their neighbours into a single batched prompt
+        translated_text = flights.do((text_to_translate, 'zh-cn'), batcher.translate, text_to_translate)
         
         return jsonify({
             'original_text': text_to_translate,
-            'translated_text': response.text.strip()
+            'translated_text': translated_text
         })
 
+    except Overloaded as e:
+        return overloaded(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/translate/stream', methods=['POST'])
+def translate_stream():
+    data = request.get_json(force=True, silent=True)
+    if not data or 'text' not in data:
+        return jsonify({'error': 'No text provided'}), 400
+
+    text_to_translate = data['text']
+    prompt = build_prompt(text_to_translate)
+
+    # admission happens up front so an overloaded server can still answer 503
+    try:
+        entry = scheduler.admit(estimate_call_tokens(prompt), PRIORITY_INTERACTIVE,
+                                time.monotonic() + QUEUE_TIMEOUT)
+    except Overloaded as e:
+        return overloaded(e)
+
+    def stream_events():
+        parts = []
+        chunk = None
+        try:
+            for chunk in model.generate_content(prompt, stream=True):
+                # chunks without text (e.g. safety or usage-only frames) are skipped
+                try:
+                    delta = chunk.text
+                except ValueError:
+                    continue
+                if delta:
+                    parts.append(delta)
+                    yield sse({'delta': delta})
+            scheduler.reconcile(entry, usage_tokens(chunk))
+            yield sse({
+                'original_text': text_to_translate,
+                'translated_text': "".join(parts).strip()
+            }, event='done')
+        except Exception as e:
+            yield sse({'error': str(e)}, event='error')
+
+    return Response(stream_with_context(stream_events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/translate/document', methods=['POST'])
+def translate_document():
+    data = request.get_json(force=True, silent=True)
+    text = data.get('text') if isinstance(data, dict) else None
+    if not isinstance(text, str) or not text.strip():
+        return jsonify({'error': 'No text provided'}), 400
+
+    chunks = split_document(text, DOC_CHUNK_TOKENS)
+    futures = {
+        doc_pool.submit(flights.do, (chunk, 'zh-cn'), translate_llm, chunk, PRIORITY_BULK): index
+        for index, (chunk, _) in enumerate(chunks)
+    }
+
+    if not data.get('stream'):
+        try:
+            translated = [None] * len(chunks)
+            for future, index in futures.items():
+                translated[index] = future.result()
+        except Overloaded as e:
+            return overloaded(e)
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+        return jsonify({
+            'original_text': text,
+            'translated_text': "".join(t + joiner for t, (_, joiner) in zip(translated, chunks)),
+            'chunks': len(chunks)
+        })
+
+    def stream_chunks():
+        # NDJSON: one line per chunk in completion order, then the reassembled text
+        translated = [None] * len(chunks)
+        failed = False
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                translated[index] = future.result()
+                line = {'index': index, 'total': len(chunks), 'translated_text': translated[index]}
+            except Exception as e:
+                failed = True
+                line = {'index': index, 'total': len(chunks), 'error': str(e)}
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+        if not failed:
+            yield json.dumps({
+                'done': True,
+                'translated_text': "".join(t + joiner for t, (_, joiner) in zip(translated, chunks))
+            }, ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(stream_chunks()), mimetype='application/x-ndjson')
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
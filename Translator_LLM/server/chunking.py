@@ -0,0 +1,57 @@
+# split long documents into token-bounded chunks on paragraph and sentence boundaries
+import re
+from microbatch import estimate_tokens
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_END = re.compile(r"(?<=[.!?。！？])\s+")
+
+
+def _split_oversized(text, max_tokens):
+    # sentence first; a run-on sentence is cut on word boundaries, and text
+    # without spaces (e.g. Chinese) on a plain character budget
+    max_chars = max(1, max_tokens - 1) * 4
+    pieces = []
+    for sentence in SENTENCE_END.split(text):
+        if estimate_tokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        words, current = [], []
+        for word in sentence.split(" "):
+            words.extend(word[i:i + max_chars] for i in range(0, len(word), max_chars))
+        for word in words:
+            if current and estimate_tokens(" ".join(current + [word])) > max_tokens:
+                pieces.append(" ".join(current))
+                current = []
+            current.append(word)
+        if current:
+            pieces.append(" ".join(current))
+    return pieces
+
+
+def split_document(text: str, max_tokens: int) -> list[tuple[str, str]]:
+    # returns (chunk, joiner) pairs; "".join(chunk + joiner) rebuilds the layout
+    units = []
+    for paragraph in PARAGRAPH_BREAK.split(text.strip()):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            units.append((paragraph, "\n\n"))
+        else:
+            pieces = _split_oversized(paragraph, max_tokens)
+            units.extend((piece, " ") for piece in pieces[:-1])
+            units.append((pieces[-1], "\n\n"))
+
+    chunks = []
+    current, current_tokens, joiner = [], 0, ""
+    for unit, unit_joiner in units:
+        tokens = estimate_tokens(unit)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(("".join(current).rstrip(), joiner))
+            current, current_tokens = [], 0
+        current.append(unit + unit_joiner)
+        current_tokens += tokens
+        joiner = unit_joiner
+    if current:
+        chunks.append(("".join(current).rstrip(), ""))
+    return chunks
@@ -0,0 +1,148 @@
+# collect short translation requests for a few milliseconds and send them to Gemini as one prompt
+import os
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+MAX_WAIT_MS = float(os.getenv("LLM_BATCH_MAX_WAIT_MS", "25"))
+MAX_BATCH_TOKENS = int(os.getenv("LLM_BATCH_MAX_TOKENS", "2000"))
+MAX_BATCH_ITEMS = int(os.getenv("LLM_BATCH_MAX_ITEMS", "32"))
+BATCH_WORKERS = int(os.getenv("LLM_BATCH_WORKERS", "4"))
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting English input
+    return len(text) // 4 + 1
+
+
+class _Item:
+    __slots__ = ("text", "tokens", "future", "enqueued")
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = estimate_tokens(text)
+        self.future = Future()
+        self.enqueued = time.monotonic()
+
+
+# run_batch(texts) must return one translation per input, in order, and raise
+# ValueError when the model output can't be split back; that batch then falls
+# back to one run_single(text) call per item
+class MicroBatcher:
+    def __init__(self, run_batch, run_single, max_wait_ms: float = MAX_WAIT_MS,
+                 max_batch_tokens: int = MAX_BATCH_TOKENS,
+                 max_items: int = MAX_BATCH_ITEMS, workers: int = BATCH_WORKERS):
+        self.run_batch = run_batch
+        self.run_single = run_single
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_tokens = max_batch_tokens
+        self.max_items = max_items
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._executor = None
+        self._waits = deque(maxlen=1000)
+        self.stats = {"items": 0, "batches": 0, "direct": 0,
+                      "fallbacks": 0, "batch_sizes": {}}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_wait > 0 and self.max_items > 1
+
+    def _ensure_worker(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="llm-batch")
+                threading.Thread(target=self._collect, name="llm-batcher", daemon=True).start()
+                self._pid = os.getpid()
+
+    def translate(self, text: str, timeout: float | None = None) -> str:
+        # long texts gain nothing from sharing a prompt, so they skip the window
+        if not self.enabled or estimate_tokens(text) * 2 > self.max_batch_tokens:
+            with self._lock:
+                self.stats["direct"] += 1
+            return self.run_single(text)
+        self._ensure_worker()
+        item = _Item(text)
+        self._queue.put(item)
+        return item.future.result(timeout)
+
+    def _collect(self):
+        carry = None
+        while True:
+            first = carry or self._queue.get()
+            carry = None
+            batch = [first]
+            tokens = first.tokens
+            deadline = first.enqueued + self.max_wait
+            while len(batch) < self.max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if tokens + item.tokens > self.max_batch_tokens:
+                    carry = item
+                    break
+                batch.append(item)
+                tokens += item.tokens
+            self._executor.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch):
+        started = time.monotonic()
+        with self._lock:
+            self.stats["items"] += len(batch)
+            self.stats["batches"] += 1
+            sizes = self.stats["batch_sizes"]
+            sizes[len(batch)] = sizes.get(len(batch), 0) + 1
+            self._waits.extend(started - item.enqueued for item in batch)
+
+        if len(batch) > 1:
+            try:
+                results = self.run_batch([item.text for item in batch])
+                if len(results) != len(batch):
+                    raise ValueError(f"expected {len(batch)} translations, got {len(results)}")
+                for item, result in zip(batch, results):
+                    item.future.set_result(result)
+                return
+            except ValueError as e:
+                log.warning("Batch of %d could not be split, retrying one by one: %s", len(batch), e)
+                with self._lock:
+                    self.stats["fallbacks"] += 1
+            except Exception as e:
+                for item in batch:
+                    item.future.set_exception(e)
+                return
+
+        for item in batch:
+            try:
+                item.future.set_result(self.run_single(item.text))
+            except Exception as e:
+                item.future.set_exception(e)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["batch_sizes"] = dict(sorted(self.stats["batch_sizes"].items()))
+            waits = sorted(self._waits)
+        if waits:
+            stats["added_wait_ms"] = {
+                "p50": round(waits[len(waits) // 2] * 1000, 2),
+                "p95": round(waits[int(len(waits) * 0.95)] * 1000, 2),
+                "max": round(waits[-1] * 1000, 2),
+            }
+        stats["avg_batch_size"] = round(stats["items"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["max_wait_ms"] = self.max_wait * 1000
+        stats["max_batch_tokens"] = self.max_batch_tokens
+        return stats
@@ -0,0 +1,154 @@
+# admission control for Gemini: requests/tokens per minute budgets with a priority queue in front
+import os
+import math
+import time
+import heapq
+import random
+import logging
+import itertools
+import threading
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "60"))
+TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "250000"))
+MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "100"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+WINDOW = 60.0
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+
+class Overloaded(Exception):
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+class QueueFull(Overloaded):
+    pass
+
+
+class DeadlineExceeded(Overloaded):
+    pass
+
+
+class AdmissionScheduler:
+    def __init__(self, rpm: int = RPM_LIMIT, tpm: int = TPM_LIMIT, max_queue: int = MAX_QUEUE,
+                 max_retries: int = MAX_RETRIES, retry_on: tuple = ()):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.retry_on = retry_on
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._window = deque()  # [admitted_at, tokens] per call in the last minute
+        self.stats = {"admitted": 0, "rejected": 0, "expired": 0, "retries": 0,
+                      "estimated_tokens": 0, "actual_tokens": 0}
+
+    def _budget_wait(self, now, tokens):
+        # seconds until a call of `tokens` fits in both budgets (0 = now)
+        while self._window and self._window[0][0] <= now - WINDOW:
+            self._window.popleft()
+        if not self._window:
+            return 0.0
+        waits = []
+        if len(self._window) >= self.rpm:
+            waits.append(self._window[len(self._window) - self.rpm][0] + WINDOW - now)
+        used = sum(entry[1] for entry in self._window)
+        if used + min(tokens, self.tpm) > self.tpm:
+            # oldest entries drop out first, so find how many must expire
+            excess = used + min(tokens, self.tpm) - self.tpm
+            for admitted_at, spent in self._window:
+                excess -= spent
+                if excess <= 0:
+                    waits.append(admitted_at + WINDOW - now)
+                    break
+        return max(waits, default=0.0)
+
+    def _retry_after(self):
+        return len(self._heap) * WINDOW / max(self.rpm, 1) or 1
+
+    def admit(self, tokens: int, priority: int = PRIORITY_INTERACTIVE,
+              deadline: float | None = None) -> list:
+        with self._cond:
+            if len(self._heap) >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise QueueFull("Translation queue is full", self._retry_after())
+            ticket = [priority, next(self._seq)]
+            heapq.heappush(self._heap, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if deadline is not None and now >= deadline:
+                        self.stats["expired"] += 1
+                        raise DeadlineExceeded("Timed out waiting for translation capacity",
+                                               self._retry_after())
+                    timeout = None
+                    if self._heap[0] is ticket:
+                        timeout = self._budget_wait(now, tokens)
+                        if timeout <= 0:
+                            heapq.heappop(self._heap)
+                            entry = [now, tokens]
+                            self._window.append(entry)
+                            self.stats["admitted"] += 1
+                            self.stats["estimated_tokens"] += tokens
+                            self._cond.notify_all()
+                            return entry
+                    if deadline is not None:
+                        timeout = min(timeout if timeout is not None else math.inf, deadline - now)
+                    self._cond.wait(timeout)
+            except BaseException:
+                if ticket in self._heap:
+                    self._heap.remove(ticket)
+                    heapq.heapify(self._heap)
+                    self._cond.notify_all()
+                raise
+
+    def reconcile(self, entry: list, actual_tokens: int | None):
+        # swap the pre-call estimate for the real usage once Gemini reports it
+        if actual_tokens is None:
+            return
+        with self._cond:
+            self.stats["actual_tokens"] += actual_tokens
+            entry[1] = actual_tokens
+            self._cond.notify_all()
+
+    def call(self, fn, tokens: int, priority: int = PRIORITY_INTERACTIVE,
+             deadline: float | None = None):
+        for attempt in range(self.max_retries + 1):
+            entry = self.admit(tokens, priority, deadline)
+            try:
+                response = fn()
+            except self.retry_on as e:
+                delay = min(30.0, 2 ** attempt) * (0.5 + random.random() / 2)
+                if attempt == self.max_retries or (deadline is not None and time.monotonic() + delay >= deadline):
+                    raise Overloaded("Upstream rate limit reached", delay) from e
+                log.warning("Rate limited by upstream (attempt %d), retrying in %.1fs", attempt + 1, delay)
+                with self._cond:
+                    self.stats["retries"] += 1
+                time.sleep(delay)
+                continue
+            self.reconcile(entry, usage_tokens(response))
+            return response
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            self._budget_wait(time.monotonic(), 0)
+            stats = dict(self.stats)
+            stats["queued"] = len(self._heap)
+            stats["window_requests"] = len(self._window)
+            stats["window_tokens"] = sum(entry[1] for entry in self._window)
+        stats["rpm_limit"] = self.rpm
+        stats["tpm_limit"] = self.tpm
+        stats["max_queue"] = self.max_queue
+        return stats
+
+
+def usage_tokens(response) -> int | None:
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None) or None
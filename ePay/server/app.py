@@ -1,14 +1,35 @@
 # Flask proxy between the Android app, Stripe and Google Sheets
 import logging
+import stripe
 from dotenv import load_dotenv
 load_dotenv()
 
 from flask import Flask, request, jsonify
-from stripe_service import create_payment_intent, retrieve_payment_intent
-from sheets_service import append_transaction
+import os
+import time
+from stripe_service import (create_payment_intent, retrieve_payment_intent, construct_event,
+                            webhook_secret, latency_stats)
+from sheets_service import append_transaction, append_stats, log_queue
+from payment_store import PaymentStore
+from reconcile import run as run_reconcile, parse_since
 
 logging.basicConfig(level=logging.INFO)
 app = Flask(__name__)
+payments = PaymentStore()
+MAX_WAIT = 30
+# a non-final status older than this is checked with Stripe again, in case a webhook was missed
+STATUS_MAX_AGE = float(os.getenv("PAYMENT_STATUS_MAX_AGE", "60"))
+FINAL_STATUSES = ("succeeded", "canceled")
+
+
+# rows journaled before a restart are flushed right away, not on the next enqueue
+log_queue.start()
+
+
+@app.before_request
+def start_workers():
+    # no-op once running; starts a fresh flusher in each forked worker
+    log_queue.start()
 
 
 # helpers
@@ -32,6 +53,7 @@ def create_payment():
         name = str(data.get("customer_name", ""))
         email = data.get("customer_email")
         google_email = data.get("google_email")
+        client_key = data.get("idempotency_key")
     except (TypeError, ValueError):
         return bad("Invalid payload")
 
@@ -42,9 +64,10 @@ def create_payment():
     if not name:
         return bad("customer_name required")
 
-    ok, result = create_payment_intent(amount, currency, note, name, email)
+    ok, result = create_payment_intent(amount, currency, note, name, email, client_key)
 
     if ok:
+        payments.put(result["payment_intent_id"], result["status"], amount, currency)
         return jsonify(
             success=True,
             payment_intent_id=result["payment_intent_id"],
@@ -56,14 +79,85 @@ def create_payment():
                    error=result.get("error", "Unknown")), 400
 
 
+def payment_status(pi_id):
+    # served from the webhook-fed store; Stripe is only asked about unknown
+    # intents and about non-final statuses that have not changed for a while
+    stored = payments.get(pi_id)
+    if stored and (stored["status"] in FINAL_STATUSES
+                   or time.time() - stored["observed_at"] < STATUS_MAX_AGE):
+        return True, stored
+    ok, data = retrieve_payment_intent(pi_id)
+    if ok:
+        payments.put(pi_id, data["status"], data.get("amount"), data.get("currency"))
+    elif stored:
+        return True, stored
+    return ok, data
+
+
 @app.get("/payments/<pi_id>")
 def get_payment(pi_id):
-    ok, data = retrieve_payment_intent(pi_id)
+    ok, data = payment_status(pi_id)
     if ok:
         return jsonify(success=True, **data)
     return jsonify(success=False, error=data.get("error")), 404
 
 
+@app.get("/payments/<pi_id>/wait")
+def wait_payment(pi_id):
+    # long-poll: returns once the status differs from ?status=, or after ?timeout= seconds
+    try:
+        timeout = min(float(request.args.get("timeout", 25)), MAX_WAIT)
+    except ValueError:
+        return bad("timeout must be a number")
+    ok, data = payment_status(pi_id)
+    if not ok:
+        return jsonify(success=False, error=data.get("error")), 404
+    known = request.args.get("status")
+    if data["status"] == known:
+        data = payments.wait(pi_id, known, timeout)
+    return jsonify(success=True, changed=data["status"] != known, **data)
+
+
+@app.post("/webhooks/stripe")
+def stripe_webhook():
+    if not webhook_secret():
+        return bad("Webhook secret not configured", 503)
+    try:
+        event = construct_event(request.get_data(), request.headers.get("Stripe-Signature", ""))
+    except ValueError:
+        return bad("Invalid payload")
+    except stripe.error.SignatureVerificationError:
+        return bad("Invalid signature")
+    applied = payments.apply_event(event)
+    return jsonify(success=True, applied=applied)
+
+
+@app.post("/transactions/reconcile")
+def reconcile_transactions():
+    d = request.get_json(silent=True) or {}
+    try:
+        since = parse_since(d.get("since"))
+        limit = int(d.get("limit", 100))
+    except (TypeError, ValueError):
+        return bad("since must be YYYY-MM-DD and limit a number")
+    try:
+        report = run_reconcile(since, bool(d.get("backfill")), limit)
+    except Exception as e:
+        logging.getLogger(__name__).error("Reconciliation failed: %s", e)
+        return bad(str(e), 502)
+    return jsonify(success=True, **report)
+
+
+@app.get("/stripe/stats")
+def stripe_stats():
+    return jsonify(latency_stats())
+
+
+@app.get("/payments/stats")
+def payment_store_stats():
+    return jsonify(payments.snapshot())
+
+
 @app.post("/transactions/log")
 def log_only():
     d = request.get_json(silent=True) or {}
@@ -77,7 +171,17 @@ def log_only():
         google_email=d.get("google_email"),
         error_message=d.get("error_message"),
     )
-    return jsonify(success=ok, message="Logged" if ok else "Log failed")
+    return jsonify(success=ok, message="Queued" if ok else "Log failed"), 202 if ok else 200
+
+
+@app.get("/transactions/stats")
+def log_stats():
+    return jsonify(append_stats())
+
+
+@app.get("/transactions/queue")
+def log_queue_status():
+    return jsonify(log_queue.snapshot())
 
 
 if __name__ == "__main__":
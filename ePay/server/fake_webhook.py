@@ -0,0 +1,67 @@
+# post signed fake payment_intent.* events to a local server, in place of `stripe listen`
+#   python fake_webhook.py pi_123 succeeded
+#   python fake_webhook.py pi_123 processing --url http://localhost:5000/webhooks/stripe
+import os
+import hmac
+import json
+import time
+import uuid
+import hashlib
+import argparse
+import urllib.error
+import urllib.request
+from dotenv import load_dotenv
+
+EVENT_TYPES = {
+    "requires_payment_method": "payment_intent.created",
+    "processing": "payment_intent.processing",
+    "succeeded": "payment_intent.succeeded",
+    "canceled": "payment_intent.canceled",
+}
+
+
+def build_event(pi_id: str, status: str, amount: int, currency: str, created: int) -> dict:
+    return {
+        "id": f"evt_{uuid.uuid4().hex[:24]}",
+        "object": "event",
+        "type": EVENT_TYPES.get(status, "payment_intent.payment_failed"),
+        "created": created,
+        "data": {"object": {
+            "id": pi_id, "object": "payment_intent", "status": status,
+            "amount": amount, "currency": currency,
+        }},
+    }
+
+
+def sign(payload: str, secret: str, timestamp: int) -> str:
+    # same scheme Stripe uses: HMAC-SHA256 over "<timestamp>.<body>"
+    mac = hmac.new(secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256)
+    return f"t={timestamp},v1={mac.hexdigest()}"
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("pi_id")
+    parser.add_argument("status")
+    parser.add_argument("--amount", type=int, default=2500)
+    parser.add_argument("--currency", default="usd")
+    parser.add_argument("--url", default="http://localhost:5000/webhooks/stripe")
+    parser.add_argument("--secret", default=os.getenv("STRIPE_WEBHOOK_SECRET", ""))
+    args = parser.parse_args()
+
+    now = int(time.time())
+    payload = json.dumps(build_event(args.pi_id, args.status, args.amount, args.currency, now))
+    req = urllib.request.Request(args.url, data=payload.encode(), method="POST", headers={
+        "Content-Type": "application/json",
+        "Stripe-Signature": sign(payload, args.secret, now),
+    })
+    try:
+        with urllib.request.urlopen(req) as resp:
+            print(resp.status, resp.read().decode())
+    except urllib.error.HTTPError as e:
+        print(e.code, e.read().decode())
+
+
+if __name__ == "__main__":
+    main()
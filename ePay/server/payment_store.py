@@ -0,0 +1,111 @@
+# local PaymentIntent status store fed by Stripe webhooks, with long-poll waits
+import os
+import time
+import sqlite3
+import threading
+
+STORE_DB = os.getenv("PAYMENT_STORE_DB", "payment_store.sqlite3")
+# waiters re-read the store this often so updates written by other workers are seen too
+POLL_INTERVAL = 1.0
+
+
+class PaymentStore:
+    def __init__(self, db_path: str = STORE_DB):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._db_pid = None
+        self._changed = threading.Condition()
+        self._lock = threading.Lock()
+        self.stats = {"events": 0, "duplicate_events": 0, "stale_events": 0,
+                      "hits": 0, "misses": 0, "waits": 0}
+        db = self._db()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS payments ("
+            " pi_id TEXT PRIMARY KEY, status TEXT NOT NULL, amount INTEGER,"
+            " currency TEXT, observed_at INTEGER NOT NULL)"
+        )
+        db.execute("CREATE TABLE IF NOT EXISTS events (id TEXT PRIMARY KEY, received_at REAL NOT NULL)")
+
+    def _db(self):
+        if self._db_pid != os.getpid():
+            # forked: connections opened by the parent must not be used here
+            self._local = threading.local()
+            self._db_pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def put(self, pi_id: str, status: str, amount: int | None = None,
+            currency: str | None = None, observed_at: int | None = None) -> bool:
+        # Stripe may deliver events out of order; an older observation never
+        # overwrites a newer one
+        observed_at = int(time.time()) if observed_at is None else observed_at
+        cur = self._db().execute(
+            "INSERT INTO payments VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT (pi_id) DO UPDATE SET status = excluded.status,"
+            " amount = COALESCE(excluded.amount, amount), currency = COALESCE(excluded.currency, currency),"
+            " observed_at = excluded.observed_at WHERE excluded.observed_at >= payments.observed_at",
+            (pi_id, status, amount, currency, observed_at)
+        )
+        if cur.rowcount:
+            with self._changed:
+                self._changed.notify_all()
+        return bool(cur.rowcount)
+
+    def apply_event(self, event) -> bool:
+        # returns False for events already seen or not about a PaymentIntent
+        if not event["type"].startswith("payment_intent."):
+            return False
+        try:
+            self._db().execute("INSERT INTO events VALUES (?, ?)", (event["id"], time.time()))
+        except sqlite3.IntegrityError:
+            self._count("duplicate_events")
+            return False
+        self._count("events")
+        intent = event["data"]["object"]
+        # a timestamp from the future would make every later event look stale
+        observed_at = min(int(event["created"]), int(time.time()))
+        applied = self.put(intent["id"], intent["status"], intent.get("amount"),
+                           intent.get("currency"), observed_at)
+        if not applied:
+            self._count("stale_events")
+        return applied
+
+    def get(self, pi_id: str) -> dict | None:
+        row = self._db().execute(
+            "SELECT status, amount, currency, observed_at FROM payments WHERE pi_id = ?", (pi_id,)
+        ).fetchone()
+        self._count("hits" if row else "misses")
+        if row is None:
+            return None
+        status, amount, currency, observed_at = row
+        return {"payment_intent_id": pi_id, "status": status, "amount": amount,
+                "currency": currency, "observed_at": observed_at}
+
+    def wait(self, pi_id: str, known_status: str | None, timeout: float) -> dict | None:
+        # returns as soon as the stored status differs from known_status, or
+        # the current record (possibly unchanged) once the timeout runs out
+        self._count("waits")
+        deadline = time.monotonic() + timeout
+        while True:
+            current = self.get(pi_id)
+            if current and current["status"] != known_status:
+                return current
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return current
+            with self._changed:
+                self._changed.wait(min(remaining, POLL_INTERVAL))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["payments"] = self._db().execute("SELECT COUNT(*) FROM payments").fetchone()[0]
+        return stats
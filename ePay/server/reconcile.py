@@ -0,0 +1,135 @@
+# reconcile Stripe PaymentIntents against the transactions sheet
+#   python reconcile.py --since 2024-09-01 [--backfill]
+import json
+import logging
+import argparse
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+load_dotenv()
+
+from stripe_service import list_payment_intents
+from sheets_service import read_transactions, append_rows, log_queue
+
+log = logging.getLogger(__name__)
+
+# transactions tab columns, see sheets_service.HEADERS
+COL_ID, COL_AMOUNT, COL_CURRENCY, COL_STATUS = 1, 2, 3, 5
+
+
+def _cents(value) -> int | None:
+    try:
+        return round(float(value) * 100)
+    except (TypeError, ValueError):
+        return None
+
+
+def index_rows(rows) -> dict:
+    # transaction_id -> every row logged for it (the app may log a retry twice)
+    index = {}
+    for row in rows:
+        if len(row) > COL_ID and row[COL_ID] and row[COL_ID] != "transaction_id":
+            index.setdefault(str(row[COL_ID]), []).append(row)
+    return index
+
+
+def _field(row, col):
+    return row[col] if len(row) > col else ""
+
+
+def compare(intent, logged: list) -> list:
+    # fields on which none of the logged rows agree with Stripe
+    checks = {
+        "amount": lambda row: _cents(_field(row, COL_AMOUNT)) == intent["amount"],
+        "currency": lambda row: str(_field(row, COL_CURRENCY)).lower() == intent["currency"],
+        "status": lambda row: _field(row, COL_STATUS) == intent["status"],
+    }
+    return [name for name, check in checks.items() if not any(check(row) for row in logged)]
+
+
+def reconcile(intents, rows) -> dict:
+    index = index_rows(rows)
+    seen = set()
+    missing, mismatched = [], []
+    for intent in intents:
+        seen.add(intent["id"])
+        logged = index.get(intent["id"])
+        if not logged:
+            missing.append(intent)
+            continue
+        fields = compare(intent, logged)
+        if fields:
+            mismatched.append({"payment_intent_id": intent["id"], "fields": fields,
+                               "stripe": {"amount": intent["amount"], "currency": intent["currency"],
+                                          "status": intent["status"]}})
+    return {
+        "intents": len(seen),
+        "logged_rows": sum(len(v) for v in index.values()),
+        "missing": missing,
+        "mismatched": mismatched,
+        "not_in_stripe": sorted(set(index) - seen),
+    }
+
+
+def backfill_row(intent) -> list:
+    metadata = intent.get("metadata") or {}
+    error = intent.get("last_payment_error") or {}
+    created = datetime.fromtimestamp(intent["created"], tz=timezone.utc)
+    return [
+        created.replace(tzinfo=None).isoformat() + "Z",
+        intent["id"],
+        f"{intent['amount']/100:.2f}",
+        intent["currency"],
+        metadata.get("note", ""),
+        intent["status"],
+        metadata.get("customer_name", ""),
+        "",
+        error.get("message", ""),
+    ]
+
+
+def run(since: int | None = None, backfill: bool = False, report_limit: int = 100) -> dict:
+    # rows still waiting in the local log queue count as logged, otherwise a
+    # backfill would duplicate them once the queue drains
+    rows = read_transactions() + log_queue.pending()
+    result = reconcile(list_payment_intents(created_gte=since), rows)
+    if since is not None:
+        # older rows were logged for intents outside the listed window
+        result["not_in_stripe"] = []
+    missing = result["missing"]
+    backfilled = 0
+    if backfill and missing:
+        append_rows([backfill_row(intent) for intent in missing])
+        backfilled = len(missing)
+        log.info("Back-filled %d transactions", backfilled)
+    return {
+        "intents": result["intents"],
+        "logged_rows": result["logged_rows"],
+        "missing_count": len(missing),
+        "mismatched_count": len(result["mismatched"]),
+        "not_in_stripe_count": len(result["not_in_stripe"]),
+        "backfilled": backfilled,
+        "missing": [intent["id"] for intent in missing[:report_limit]],
+        "mismatched": result["mismatched"][:report_limit],
+        "not_in_stripe": result["not_in_stripe"][:report_limit],
+    }
+
+
+def parse_since(value: str | None) -> int | None:
+    if not value:
+        return None
+    day = datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    return int(day.timestamp())
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Reconcile Stripe PaymentIntents with the transactions sheet")
+    parser.add_argument("--since", help="only intents created on or after YYYY-MM-DD")
+    parser.add_argument("--backfill", action="store_true", help="append missing intents to the sheet")
+    parser.add_argument("--limit", type=int, default=100, help="max ids listed per section")
+    args = parser.parse_args()
+    print(json.dumps(run(parse_since(args.since), args.backfill, args.limit), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,15 @@
 # append a row to Google Sheets using a service account
 import os
+import time
 import logging
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
+import httplib2
 from google.oauth2 import service_account
+from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
+from transaction_queue import TransactionQueue
 
 log = logging.getLogger(__name__)
 
@@ -12,22 +18,113 @@ HEADERS = [
     "timestamp", "transaction_id", "amount", "currency",
     "note", "status", "customer_name", "google_email", "error_message"
 ]
+HTTP_TIMEOUT = 15
+# refresh the access token a bit before Google would reject it
+REFRESH_MARGIN = timedelta(minutes=5)
+
+# credentials are shared; httplib2 transports are not thread-safe, so each
+# thread builds its own service object once and keeps reusing it
+_creds = None
+_creds_lock = threading.Lock()
+_local = threading.local()
+_stats_lock = threading.Lock()
+_stats = {"appends": 0, "rows": 0, "failures": 0, "service_builds": 0, "token_refreshes": 0,
+          "total_ms": 0.0, "last_ms": None}
+
+
+def _count(key, amount=1):
+    with _stats_lock:
+        _stats[key] += amount
+
+
+def _credentials():
+    global _creds
+    with _creds_lock:
+        if _creds is None:
+            key_file = os.getenv("GOOGLE_SERVICE_ACCOUNT_FILE")
+            if not key_file or not os.path.exists(key_file):
+                raise RuntimeError(f"Service account file not found: {key_file}")
+            _creds = service_account.Credentials.from_service_account_file(key_file, scopes=SCOPES)
+        expiry = _creds.expiry.replace(tzinfo=None) if _creds.expiry else None
+        if not _creds.valid or (expiry and expiry - datetime.utcnow() < REFRESH_MARGIN):
+            _creds.refresh(Request())
+            _count("token_refreshes")
+        return _creds
 
 
 def _service():
-    key_file = os.getenv("GOOGLE_SERVICE_ACCOUNT_FILE")
-    if not key_file or not os.path.exists(key_file):
-        raise RuntimeError(f"Service account file not found: {key_file}")
-    creds = service_account.Credentials.from_service_account_file(key_file, scopes=SCOPES)
-    return build("sheets", "v4", credentials=creds, cache_discovery=False)
+    creds = _credentials()
+    svc = getattr(_local, "service", None)
+    if svc is None:
+        http = AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+        svc = build("sheets", "v4", http=http, cache_discovery=False)
+        _local.service = svc
+        _count("service_builds")
+    return svc
 
 
-def append_transaction(payment_intent_id: str, amount: int, currency: str,
-                       note: str, status: str, customer_name: str,
-                       google_email: str | None, error_message: str | None):
+def append_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    done = stats["appends"]
+    stats["avg_ms"] = round(stats["total_ms"] / done, 1) if done else None
+    stats["total_ms"] = round(stats["total_ms"], 1)
+    return stats
+
+
+def append_rows(rows: list):
+    # one values.append call for the whole batch; raises so the queue can retry
+    sheet_id = os.getenv("GOOGLE_SHEET_ID")
+    tab = os.getenv("GOOGLE_SHEET_TAB", "Transactions")
+    if not sheet_id:
+        raise RuntimeError("GOOGLE_SHEET_ID not set")
+
+    started = time.perf_counter()
+    try:
+        svc = _service()
+        svc.spreadsheets().values().append(
+            spreadsheetId=sheet_id,
+            range=f"{tab}!A:I",
+            valueInputOption="USER_ENTERED",
+            insertDataOption="INSERT_ROWS",
+            body={"values": rows},
+        ).execute()
+    except Exception as e:
+        log.error("Sheets append failed: %s", e)
+        _count("failures")
+        raise
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    with _stats_lock:
+        _stats["appends"] += 1
+        _stats["rows"] += len(rows)
+        _stats["total_ms"] += elapsed_ms
+        _stats["last_ms"] = round(elapsed_ms, 1)
+    log.info("Sheets append of %d rows took %.1f ms", len(rows), elapsed_ms)
+
+
+def read_transactions() -> list:
+    # the whole transactions tab in a single range read
     sheet_id = os.getenv("GOOGLE_SHEET_ID")
     tab = os.getenv("GOOGLE_SHEET_TAB", "Transactions")
     if not sheet_id:
+        raise RuntimeError("GOOGLE_SHEET_ID not set")
+    result = _service().spreadsheets().values().get(
+        spreadsheetId=sheet_id,
+        range=f"{tab}!A:I",
+        valueRenderOption="UNFORMATTED_VALUE",
+    ).execute()
+    return result.get("values", [])
+
+
+log_queue = TransactionQueue(append_rows)
+
+
+def append_transaction(payment_intent_id: str, amount: int, currency: str,
+                       note: str, status: str, customer_name: str,
+                       google_email: str | None, error_message: str | None):
+    # journaled locally and appended in the background; True means accepted
+    if not os.getenv("GOOGLE_SHEET_ID"):
         log.warning("GOOGLE_SHEET_ID not set — skipping log")
         return False
 
@@ -42,17 +139,9 @@ def append_transaction(payment_intent_id: str, amount: int, currency: str,
         google_email or "",
         error_message or "",
     ]
-
     try:
-        svc = _service()
-        svc.spreadsheets().values().append(
-            spreadsheetId=sheet_id,
-            range=f"{tab}!A:I",
-            valueInputOption="USER_ENTERED",
-            insertDataOption="INSERT_ROWS",
-            body={"values": [row]},
-        ).execute()
-        return True
+        log_queue.enqueue(row)
     except Exception as e:
-        log.error("Sheets append failed: %s", e)
-        return False
\ No newline at end of file
+        log.error("Transaction log enqueue failed: %s", e)
+        return False
+    return True
@@ -1,51 +1,161 @@
 # wrapper around Stripe PaymentIntents
 import os
-import stripe
+import json
+import time
+import uuid
+import random
+import hashlib
 import logging
+import threading
+import requests
+import stripe
+from requests.adapters import HTTPAdapter
 
 log = logging.getLogger(__name__)
 stripe.api_key = os.getenv("STRIPE_SECRET_KEY", "")
 
+CONNECT_TIMEOUT = float(os.getenv("STRIPE_CONNECT_TIMEOUT", "3"))
+READ_TIMEOUT = float(os.getenv("STRIPE_READ_TIMEOUT", "20"))
+POOL_SIZE = int(os.getenv("STRIPE_POOL_SIZE", "10"))
+MAX_RETRIES = int(os.getenv("STRIPE_MAX_RETRIES", "3"))
+BACKOFF_BASE = 0.5
+# signed webhook timestamps older than this are rejected as replays
+WEBHOOK_TOLERANCE = 300
+BACKOFF_CAP = 8.0
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000)
 
-def create_payment_intent(amount: int, currency: str, note: str,
-                          customer_name: str, customer_email: str | None = None):
-    
-    # create a PaymentIntent. Retry once on transient API errors
-    for attempt in range(2):
+# one keep-alive pool shared by every request thread; retries are handled
+# below so they can reuse the same idempotency key
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE))
+stripe.default_http_client = stripe.http_client.RequestsClient(
+    timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), session=_session)
+stripe.max_network_retries = 0
+
+_latency_lock = threading.Lock()
+_latency = {}
+
+
+def _observe(op: str, elapsed_ms: float, error: bool):
+    with _latency_lock:
+        h = _latency.setdefault(op, {"calls": 0, "errors": 0, "total_ms": 0.0,
+                                     "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1)})
+        h["calls"] += 1
+        h["errors"] += int(error)
+        h["total_ms"] += elapsed_ms
+        i = next((i for i, edge in enumerate(LATENCY_BUCKETS_MS) if elapsed_ms <= edge),
+                 len(LATENCY_BUCKETS_MS))
+        h["buckets"][i] += 1
+
+
+def latency_stats() -> dict:
+    with _latency_lock:
+        ops = {op: dict(h, buckets=list(h["buckets"])) for op, h in _latency.items()}
+    labels = [f"le_{edge}ms" for edge in LATENCY_BUCKETS_MS] + ["inf"]
+    for h in ops.values():
+        h["avg_ms"] = round(h["total_ms"] / h["calls"], 1) if h["calls"] else None
+        h["total_ms"] = round(h["total_ms"], 1)
+        h["buckets"] = dict(zip(labels, h["buckets"]))
+    return ops
+
+
+def _retryable(e) -> bool:
+    if isinstance(e, (stripe.error.APIConnectionError, stripe.error.RateLimitError)):
+        return True
+    return isinstance(e, stripe.error.APIError) and (e.http_status or 500) >= 500
+
+
+def _call(op: str, fn, **params):
+    # every attempt is timed on its own; transient failures back off with
+    # full jitter, everything else is raised straight away
+    for attempt in range(MAX_RETRIES + 1):
+        started = time.perf_counter()
         try:
-            intent = stripe.PaymentIntent.create(
-                amount=amount,
-                currency=currency,
-                description=note or "ePay payment",
-                receipt_email=customer_email,
-                metadata={
-                    "customer_name": customer_name,
-                    "note": note,
-                },
-                automatic_payment_methods={"enabled": True},
-            )
-            return True, {
-                "payment_intent_id": intent.id,
-                "client_secret": intent.client_secret,
-                "status": intent.status,
-            }
-        except stripe.error.CardError as e:
-            return False, {"error": e.user_message or "Card declined", "status": "failed"}
-        except stripe.error.APIConnectionError as e:
-            log.warning("Stripe connection error attempt %d: %s", attempt, e)
-            if attempt == 1:
-                return False, {"error": "Network error reaching Stripe", "status": "failed"}
+            result = fn(**params)
         except stripe.error.StripeError as e:
-            return False, {"error": str(e), "status": "failed"}
-    return False, {"error": "Unknown", "status": "failed"}
+            _observe(op, (time.perf_counter() - started) * 1000, True)
+            if attempt == MAX_RETRIES or not _retryable(e):
+                raise
+            delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+            log.warning("Stripe %s failed (attempt %d), retrying in %.2fs: %s", op, attempt + 1, delay, e)
+            time.sleep(delay)
+            continue
+        _observe(op, (time.perf_counter() - started) * 1000, False)
+        return result
+
+
+def idempotency_key(params: dict, client_key: str | None = None) -> str:
+    # the same client key with the same params always maps to the same Stripe
+    # key, so client resubmits are safe too; without one, only our own retries are
+    seed = client_key or uuid.uuid4().hex
+    digest = hashlib.sha256((json.dumps(params, sort_keys=True) + seed).encode()).hexdigest()
+    return f"epay-{digest[:48]}"
+
+
+def create_payment_intent(amount: int, currency: str, note: str,
+                          customer_name: str, customer_email: str | None = None,
+                          client_key: str | None = None):
+    params = dict(
+        amount=amount,
+        currency=currency,
+        description=note or "ePay payment",
+        receipt_email=customer_email,
+        metadata={
+            "customer_name": customer_name,
+            "note": note,
+        },
+        automatic_payment_methods={"enabled": True},
+    )
+    try:
+        intent = _call("create", stripe.PaymentIntent.create,
+                       idempotency_key=idempotency_key(params, client_key), **params)
+        return True, {
+            "payment_intent_id": intent.id,
+            "client_secret": intent.client_secret,
+            "status": intent.status,
+        }
+    except stripe.error.CardError as e:
+        return False, {"error": e.user_message or "Card declined", "status": "failed"}
+    except stripe.error.APIConnectionError as e:
+        log.warning("Stripe connection error: %s", e)
+        return False, {"error": "Network error reaching Stripe", "status": "failed"}
+    except stripe.error.StripeError as e:
+        return False, {"error": str(e), "status": "failed"}
 
 
 def retrieve_payment_intent(pi_id: str):
     try:
-        intent = stripe.PaymentIntent.retrieve(pi_id)
+        intent = _call("retrieve", stripe.PaymentIntent.retrieve, id=pi_id)
         return True, {
             "payment_intent_id": intent.id,
             "status": intent.status,
+            "amount": intent.amount,
+            "currency": intent.currency,
         }
     except stripe.error.StripeError as e:
-        return False, {"error": str(e)}
\ No newline at end of file
+        return False, {"error": str(e)}
+
+
+def webhook_secret() -> str:
+    return os.getenv("STRIPE_WEBHOOK_SECRET", "")
+
+
+def construct_event(payload: bytes, sig_header: str):
+    # raises ValueError on a malformed body and SignatureVerificationError on a
+    # bad or stale signature; callers must check webhook_secret() first, an
+    # empty key would accept events signed by anyone
+    return stripe.Webhook.construct_event(payload, sig_header, webhook_secret(),
+                                          tolerance=WEBHOOK_TOLERANCE)
+
+
+def list_payment_intents(created_gte: int | None = None, page_size: int = 100):
+    # cursor pagination, one list call per page of up to 100 intents
+    params = {"limit": page_size}
+    if created_gte is not None:
+        params["created"] = {"gte": created_gte}
+    while True:
+        page = _call("list", stripe.PaymentIntent.list, **params)
+        yield from page.data
+        if not page.has_more or not page.data:
+            return
+        params["starting_after"] = page.data[-1].id
@@ -0,0 +1,145 @@
+# durable transaction log queue: rows land in SQLite first and a background worker appends them in batches
+import os
+import json
+import time
+import logging
+import sqlite3
+import threading
+
+log = logging.getLogger(__name__)
+
+QUEUE_DB = os.getenv("TRANSACTION_QUEUE_DB", "transaction_queue.sqlite3")
+FLUSH_BATCH_SIZE = int(os.getenv("TRANSACTION_FLUSH_BATCH_SIZE", "100"))
+FLUSH_INTERVAL = float(os.getenv("TRANSACTION_FLUSH_INTERVAL", "2"))
+MAX_BACKOFF = float(os.getenv("TRANSACTION_MAX_BACKOFF", "60"))
+# rows claimed by a worker that died mid-flush become visible again after this long
+LEASE_SECONDS = 120
+
+
+class TransactionQueue:
+    def __init__(self, append_rows, db_path: str = QUEUE_DB,
+                 batch_size: int = FLUSH_BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL):
+        self.append_rows = append_rows
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._db_pid = None
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+        self.stats = {"enqueued": 0, "flushed": 0, "flushes": 0, "failures": 0,
+                      "backoff_s": 0.0, "last_error": None}
+        self._db().execute(
+            "CREATE TABLE IF NOT EXISTS queue ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL,"
+            " created_at REAL NOT NULL, lease_until REAL)"
+        )
+
+    def _db(self):
+        if self._db_pid != os.getpid():
+            # forked: connections opened by the parent must not be used here
+            self._local = threading.local()
+            self._db_pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def start(self):
+        # one worker per process; started lazily so forked workers get their own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                threading.Thread(target=self._run, name="transaction-log", daemon=True).start()
+                self._pid = os.getpid()
+
+    def enqueue(self, row: list):
+        self.start()
+        self._db().execute(
+            "INSERT INTO queue (payload, created_at) VALUES (?, ?)",
+            (json.dumps(row), time.time())
+        )
+        with self._lock:
+            self.stats["enqueued"] += 1
+        if self.depth() >= self.batch_size:
+            self._wakeup.set()
+
+    def _claim(self):
+        db = self._db()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = db.execute(
+                "SELECT id, payload FROM queue WHERE lease_until IS NULL OR lease_until < ?"
+                " ORDER BY id LIMIT ?",
+                (now, self.batch_size)
+            ).fetchall()
+            db.executemany("UPDATE queue SET lease_until = ? WHERE id = ?",
+                           [(now + LEASE_SECONDS, row_id) for row_id, _ in rows])
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return [row_id for row_id, _ in rows], [json.loads(payload) for _, payload in rows]
+
+    def flush(self) -> int:
+        db = self._db()
+        flushed = 0
+        while True:
+            ids, values = self._claim()
+            if not ids:
+                break
+            try:
+                self.append_rows(values)
+            except Exception:
+                db.executemany("UPDATE queue SET lease_until = NULL WHERE id = ?", [(i,) for i in ids])
+                raise
+            db.executemany("DELETE FROM queue WHERE id = ?", [(i,) for i in ids])
+            flushed += len(ids)
+            with self._lock:
+                self.stats["flushes"] += 1
+                self.stats["flushed"] += len(ids)
+            if len(ids) < self.batch_size:
+                break
+        return flushed
+
+    def _run(self):
+        backoff = 0.0
+        while True:
+            if backoff:
+                # new transactions must not cut a backoff short during an outage
+                time.sleep(backoff)
+            else:
+                self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                backoff = 0.0
+            except Exception as e:
+                backoff = min(MAX_BACKOFF, max(1.0, backoff * 2))
+                log.warning("Transaction log flush failed, retrying in %.0fs: %s", backoff, e)
+                with self._lock:
+                    self.stats["failures"] += 1
+                    self.stats["last_error"] = str(e)
+            with self._lock:
+                self.stats["backoff_s"] = backoff
+
+    def pending(self) -> list:
+        return [json.loads(payload) for (payload,) in
+                self._db().execute("SELECT payload FROM queue ORDER BY id")]
+
+    def depth(self) -> int:
+        return self._db().execute("SELECT COUNT(*) FROM queue").fetchone()[0]
+
+    def snapshot(self) -> dict:
+        db = self._db()
+        depth, oldest = db.execute("SELECT COUNT(*), MIN(created_at) FROM queue").fetchone()
+        with self._lock:
+            stats = dict(self.stats)
+        stats["depth"] = depth
+        stats["oldest_age_s"] = round(time.time() - oldest, 1) if oldest else 0.0
+        return stats